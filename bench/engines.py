@@ -0,0 +1,310 @@
+"""
+Conformance and throughput benchmark for the simulators sim can use.
+
+Runs a corpus of patterns and rules through bgolly (with the algo sim would use
+and, for two-state rules, the other of QuickLife and HashLife) and through every
+in-process engine that supports the rule, at each of a few steps as sim would.
+Every frame each run gives is checked against bgolly's, cell for cell. Rules sim
+gives CAViewer are checked against bgolly running the same rule as Larger than
+Life. Throughput is reported in generations/sec and in cells/sec, the cells being
+the live cells of every generation (for 1D rules, of every generation's row),
+counted from a reference run of bgolly that keeps them all. bgolly's times include
+starting the process and writing its output, and lifelib only takes part in rules
+it has already compiled.
+
+    python -m bench.engines
+    python -m bench.engines --case acorn --case wireworld --repeat 3
+    python -m bench.engines --step 1 --step 50
+    python -m bench.engines --save baseline.json
+    python -m bench.engines --baseline baseline.json
+
+With --baseline, each result is compared with the saved one, and the exit status
+is 1 if any engine disagrees with bgolly or has got slower by more than --tolerance.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench.render import BGOLLY, soup
+from cogs import ca
+from cogs.resources import engines
+from cogs.resources.engines.bounds import crop
+from cogs.resources.rle import parse_pattern, rle_runs
+
+WIREWORLD = '''@RULE WireWorldBench
+@TABLE
+n_states:4
+neighborhood:Moore
+symmetries:permute
+var a={0,1,2,3}
+var b={0,1,2,3}
+var c={0,1,2,3}
+var d={0,1,2,3}
+var e={0,1,2,3}
+var f={0,1,2,3}
+var g={0,1,2,3}
+var h={0,1,2,3}
+var i={0,2,3}
+var j={0,2,3}
+var k={0,2,3}
+var l={0,2,3}
+var m={0,2,3}
+var n={0,2,3}
+var o={0,2,3}
+var p={0,2,3}
+1,a,b,c,d,e,f,g,h,2
+2,a,b,c,d,e,f,g,h,3
+3,1,1,i,j,k,l,m,n,1
+3,1,i,j,k,l,m,n,o,1
+3,i,j,k,l,m,n,o,p,3
+3,a,b,c,d,e,f,g,h,3
+'''
+
+
+def pattern(rle, rule):
+    return f'x = 0, y = 0, rule = {rule}\n{rle}\n'
+
+
+def row_soup(size, rule):
+    return pattern(''.join(random.choice('bo') for _ in range(size)) + '!', rule)
+
+
+# name -> (rule, algo, pattern maker taking the soup size, generations)
+CORPUS = {
+    'r-pentomino': ('B3/S23', 'QuickLife', lambda size: pattern('b2o$2o$bo!', 'B3/S23'), 1103),
+    'acorn': ('B3/S23', 'QuickLife', lambda size: pattern('bo5b$3bo3b$2o2b3o!', 'B3/S23'), 5206),
+    'diehard': ('B3/S23', 'QuickLife', lambda size: pattern('6bob$2o6b$bo3b3o!', 'B3/S23'), 130),
+    'life-soup': ('B3/S23', 'QuickLife', lambda size: soup(size, 'B3/S23', 2), 500),
+    'star-wars': ('345/2/4', 'Generations', lambda size: soup(size, '345/2/4', 4), 300),
+    'bosco': (
+        'R5,C2,M1,S34..58,B34..45,NM', 'Larger than Life',
+        lambda size: soup(size, 'R5,C2,M1,S34..58,B34..45,NM', 2), 200
+    ),
+    'hrot': (
+        'R2,C3,S5-9,B7-8,NN', 'CAViewer',
+        lambda size: soup(size, 'R2,C3,M0,S5..9,B7..8,NN', 3), 200
+    ),
+    'int': ('B2-a/S12', 'QuickLife', lambda size: soup(size, 'B2-a/S12', 2), 300),
+    'rule-110': ('W110', 'QuickLife', lambda size: row_soup(size, 'W110'), 1000),
+    'wireworld': ('WireWorldBench', 'RuleLoader', lambda size: soup(size, 'WireWorldBench', 4), 300),
+}
+
+# rule -> its rule file, for RuleLoader rules
+RULE_FILES = {'WireWorldBench': WIREWORLD}
+
+# rule -> (the same rule as bgolly reads it, algo), for CAViewer rules, which are checked against bgolly
+REFERENCES = {'R2,C3,S5-9,B7-8,NN': ('R2,C3,M0,S5..9,B7..8,NN', 'Larger than Life')}
+
+# steps each case is run at, unless --step says otherwise
+STEPS = [1, 10]
+
+
+def run_bgolly(tmp, rule, algo, rle, gen, step):
+    """Runs bgolly on `rle`; returns its output's path and how long it took"""
+    with open(os.path.join(tmp, 'in.rle'), 'w') as f:
+        f.write(rle)
+    out = os.path.join(tmp, 'out.rle')
+    if os.path.exists(out):
+        os.remove(out)  # bgolly appends rather than overwrites
+    ruleflag = ['-s', f'{tmp}/'] if algo == 'RuleLoader' else ['-r', rule]
+    start = time.perf_counter()
+    subprocess.run(
+        [BGOLLY, '-a', algo, *ruleflag, '-m', str(gen), '-i', str(step), '-o', out, os.path.join(tmp, 'in.rle')],
+        check=True, stdout=subprocess.DEVNULL
+    )
+    return out, time.perf_counter() - start
+
+
+def frame_key(cells, x, y, one_d):
+    """
+    A frame, cropped to its live cells with its top-left cell at (x, y), as something
+    to compare: its shape, position, population and a digest of its cells. 1D rules
+    draw each generation under the last and the oned engine only keeps the latest rows,
+    scrolling them past a fixed window, so for them only the bottom row counts, and not
+    where it is.
+    """
+    if one_d:
+        cells, left, _ = crop(cells[-1:], 0)
+        x, y = x + left, 0
+    if not cells.size:
+        return (0, 0), 0, 0, 0, ''
+    cells = cells.astype(np.uint8, copy=False)
+    return cells.shape, x, y, int(np.count_nonzero(cells)), hashlib.sha256(cells.tobytes()).hexdigest()
+
+
+def bgolly_frames(path, one_d):
+    """Every frame of bgolly's output at `path`, as frame_key() gives them"""
+    frames = []
+    for rle, (x, y) in ca.iter_frames(path):
+        cells, (dx, dy) = parse_pattern(rle.decode())
+        frames.append(frame_key(cells, x + dx, y + dy, one_d))
+    return frames
+
+
+def run_frames(tmp, rule, algo, rle, gen, step, one_d):
+    """(frames, time taken) of bgolly running `rle` for `gen` generations every `step`"""
+    out, seconds = run_bgolly(tmp, rule, algo, rle, gen, step)
+    return bgolly_frames(out, one_d), seconds
+
+
+def first_mismatch(frames, expected, step):
+    """The generation of the first of `frames` that differs from `expected`, or None if they all match"""
+    if frames == expected:
+        return None
+    # or, if one stops short of the other, the first generation it's missing
+    same = next((i for i, (a, b) in enumerate(zip(frames, expected)) if a != b), min(len(frames), len(expected)))
+    return step * same
+
+
+def live_cells(path, one_d):
+    """Live cells summed over every generation of bgolly's output at `path`"""
+    total = 0
+    for rle, _ in ca.iter_frames(path):
+        rows, _, counts, _ = rle_runs(rle)
+        total += int(counts[rows == rows.max()].sum() if one_d and rows.size else counts.sum())
+    return total
+
+
+def best_time(run, repeat):
+    """(result, shortest time) of calling `run`, which returns (result, time), `repeat` times"""
+    runs = [run() for _ in range(repeat)]
+    return runs[0][0], min(seconds for _, seconds in runs)
+
+
+def run_engine(name, rule, rle, gen, step, one_d):
+    """(frames, time taken) of engine `name` running `rle` for `gen` generations every `step`"""
+    cells, (x, y) = parse_pattern(rle)
+    frames, seconds = [], 0
+    evolution = engines.ENGINES[name].evolve(rule, cells, x, y, gen, step)
+    while True:
+        # Timing only the engine, as bgolly's time leaves out reading its output
+        start = time.perf_counter()
+        frame = next(evolution, None)
+        seconds += time.perf_counter() - start
+        if frame is None:
+            return frames, seconds
+        frames.append(frame_key(*frame, one_d))
+
+
+def bench_case(tmp, case, size, repeat, steps):
+    """{simulator and step: result} for one case of the corpus"""
+    rule, algo, make, gen = CORPUS[case]
+    rle = make(size)
+    if rule in RULE_FILES:
+        with open(os.path.join(tmp, f'{rule}.rule'), 'w') as f:
+            f.write(RULE_FILES[rule])
+    engine_rule = RULE_FILES.get(rule, rule)
+    bgolly_rule, bgolly_algo = REFERENCES.get(rule, (rule, algo))
+
+    one_d = engines.oned.supports(rule, algo)
+    out, _ = run_bgolly(tmp, bgolly_rule, bgolly_algo, rle, gen, 1)
+    cells = live_cells(out, one_d)
+
+    bgolly_algos = [bgolly_algo]
+    if algo in ('QuickLife', 'HashLife'):
+        bgolly_algos.append('HashLife' if algo == 'QuickLife' else 'QuickLife')
+    results = {}
+    for step in steps:
+        expected = bgolly_frames(out, one_d) if step == 1 else run_frames(
+            tmp, bgolly_rule, bgolly_algo, rle, gen, step, one_d
+        )[0]
+        runs = {}
+        for other in bgolly_algos:
+            runs[f'bgolly {other}'] = lambda other=other: run_frames(tmp, bgolly_rule, other, rle, gen, step, one_d)
+        for name, engine in engines.ENGINES.items():
+            if engine.supports(engine_rule, algo):
+                runs[name] = lambda name=name: run_engine(name, engine_rule, rle, gen, step, one_d)
+        for name, run in runs.items():
+            frames, seconds = best_time(run, repeat)
+            mismatch = first_mismatch(frames, expected, step)
+            results[f'{name} @{step}'] = {
+                'seconds': seconds,
+                'gens_per_sec': gen / seconds,
+                'cells_per_sec': cells / seconds,
+                'frames': len(frames),
+                'population': frames[-1][3] if frames else 0,
+                'matches': mismatch is None,
+                'first_mismatch': mismatch,
+            }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Prints how `results` differ from `baseline`; returns whether any got slower or stopped matching bgolly"""
+    worse = False
+    for case, sims in results.items():
+        for name, result in sims.items():
+            before = baseline.get(case, {}).get(name)
+            if before is None:
+                print(f'  {case:12} {name:28} new')
+                continue
+            ratio = before['seconds'] / result['seconds']
+            notes = []
+            if ratio < 1 - tolerance:
+                notes.append('SLOWER')
+            if before['matches'] and not result['matches']:
+                notes.append('NO LONGER MATCHES')
+            if result['population'] != before['population']:
+                notes.append(f'(population was {before["population"]})')
+            worse |= 'SLOWER' in notes or 'NO LONGER MATCHES' in notes
+            print(f'  {case:12} {name:28} {ratio:6.2f}x as fast  {" ".join(notes)}')
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--case', action='append', choices=CORPUS, help='run only these cases (default: all)')
+    parser.add_argument('--size', type=int, default=200, help='side of the random soups')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=1, help='time each run this many times and keep the best')
+    parser.add_argument(
+        '--step', type=int, action='append', help=f'run at these steps (default: {", ".join(map(str, STEPS))})'
+    )
+    parser.add_argument('--save', metavar='PATH', help='write the results to PATH as JSON')
+    parser.add_argument('--baseline', metavar='PATH', help='compare the results with a JSON file --save wrote')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='slowdown a baseline comparison lets through')
+    args = parser.parse_args()
+
+    results, mismatched = {}, False
+    with tempfile.TemporaryDirectory() as tmp:
+        for case in args.case or CORPUS:
+            random.seed(f'{args.seed} {case}')
+            rule, algo, _, gen = CORPUS[case]
+            print(f'{case}: {rule} ({algo}), {gen} generations')
+            results[case] = bench_case(tmp, case, args.size, args.repeat, args.step or STEPS)
+            for name, result in sorted(results[case].items(), key=lambda item: item[1]['seconds']):
+                mismatched |= not result['matches']
+                print(
+                    f'  {name:28} {result["seconds"]:8.3f}s  {result["gens_per_sec"]:10.0f} gens/s'
+                    f'  {result["cells_per_sec"]:12.0f} cells/s  population {result["population"]}'
+                    + ('' if result['matches'] else f'  MISMATCH from generation {result["first_mismatch"]}')
+                )
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': sys.version.split()[0], 'machine': platform.machine(), 'numpy': np.__version__,
+                'size': args.size, 'seed': args.seed, 'steps': args.step or STEPS, 'results': results,
+            }, f, indent=2)
+    worse = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f'against {args.baseline}:')
+        if (baseline['size'], baseline['seed']) != (args.size, args.seed):
+            print(f'  (soups differ: baseline has --size {baseline["size"]} --seed {baseline["seed"]})')
+        worse = compare(results, baseline['results'], args.tolerance)
+    sys.exit(1 if mismatched or worse else 0)
+
+
+if __name__ == '__main__':
+    main()
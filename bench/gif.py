@@ -0,0 +1,75 @@
+"""
+GIF encoding benchmark: imageio (RGB frames, quantized per frame) versus
+`cogs.resources.gif.GIFWriter` (palette-indexed frames, fixed global palette),
+writing either full frames or only the changed rectangle of each.
+
+    python -m bench.gif --rule 345/2/8 --size 200 --gens 150
+    python -m bench.gif --rule R5,C4,M1,S34..58,B34..45,NM --size 150 --gens 80
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import imageio
+
+from bench.render import simulate
+from cogs import ca
+from cogs.resources import mutils
+from cogs.resources.gif import GIFWriter
+
+
+def n_states_of(rule):
+    if ca.rLtL.match(rule):
+        return int(ca.rLtL.match(rule)[1]), 'Larger than Life'
+    if rule.count('/') > 1:
+        return int(rule.split('/')[-1]), 'Generations'
+    return 2, 'QuickLife'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--gens', type=int, default=150)
+    parser.add_argument('--rule', default='345/2/8')
+    parser.add_argument('--grid', action='store_true')
+    args = parser.parse_args()
+
+    n_states, algo = n_states_of(args.rule)
+    bg = (54, 57, 62)
+    colors = mutils.ColorRange(n_states).to_dict() if n_states > 2 else {'o': (255, 255, 255), 'b': bg}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        current = simulate(tmp, args.size, args.gens, args.rule, algo, n_states)
+        bbox, trackmaxes, n_frames, _ = ca.scan_frames(f'{current}_out.rle')
+        raster = ca.Raster(bbox, colors, bg, False, trackmaxes, args.grid)
+        indexed = [raster.paint(canvas) for canvas in raster.decode(ca.iter_frames(f'{current}_out.rle'))]
+        rgb = [raster.palette[frame] for frame in indexed]
+        print(f'{args.rule}: {n_frames} frames of {raster.size[0]}x{raster.size[1]} px, {len(raster.palette)} colors')
+
+        start = time.perf_counter()
+        with imageio.get_writer(f'{current}_imageio.gif', mode='I', duration=str(0.05)) as writer:
+            for frame in rgb:
+                writer.append_data(frame)
+        before = time.perf_counter() - start
+
+        old_size = os.path.getsize(f'{current}_imageio.gif')
+        print(f'imageio          {before:8.3f}s  {old_size:>10} bytes')
+
+        for delta in (False, True):
+            start = time.perf_counter()
+            with GIFWriter(
+                    f'{current}_gifwriter.gif', *raster.size, raster.palette, duration=0.05, delta=delta
+            ) as writer:
+                for frame in indexed:
+                    writer.append(frame)
+            after = time.perf_counter() - start
+            new_size = os.path.getsize(f'{current}_gifwriter.gif')
+            print(
+                f'GIFWriter{" delta" if delta else "      "}  {after:8.3f}s  {new_size:>10} bytes'
+                f'  ({before / after:.1f}x faster, {new_size / old_size:.0%} size)'
+            )
+
+
+if __name__ == '__main__':
+    main()
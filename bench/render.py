@@ -0,0 +1,121 @@
+"""
+Before/after benchmark for the GIF frame rasterizer.
+
+Simulates a random soup with bgolly, then renders its frames both with the
+original list-of-lists implementation and with `cogs.ca.rasterize`,
+checking that every pixel matches.
+
+    python -m bench.render --size 500 --gens 300
+"""
+import argparse
+import os
+import random
+import re
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from cogs import ca
+from cogs.resources import mutils
+
+BGOLLY = os.path.join(os.path.dirname(os.path.abspath(ca.__file__)), 'resources', 'bgolly')
+
+
+def legacy_rasterize(frames, bbox, colors, bg, track, trackmaxes, grid):
+    """The pre-NumPy frame loop from `makeframes` (plus the '$' unrolling `parse` used to do), for comparison"""
+    xmin, ymin, width, height = bbox
+    if track:
+        width, height = trackmaxes
+    for pat, (xpos, ypos) in frames:
+        pat = re.sub(r'(\d+)\$', lambda m: '$' * int(m[1]), pat.decode()).replace('!', '').split('$')
+        dx, dy = (1, 1) if track else (1 + (xpos - xmin), 1 + (ypos - ymin))
+        frame = [[bg] * (2 + width) for _ in range(2 + height)]
+        for i, flat_row in enumerate(
+                [
+                    bg if char in '.b' else colors[char]
+                    for run, char in ca.rRUNS.findall(row)
+                    for _ in range(int(run or 1))
+                ]
+                for row in pat
+        ):
+            frame[dy + i][dx:dx + len(flat_row)] = flat_row
+        anchor = min(height, width)
+        mul = -(-100 // anchor) if anchor <= 100 else 1
+        first_grid = 0 if grid else None
+        yield np.asarray(
+            mutils.scale(
+                (mutils.scale(row, mul, grid=first_grid) for row in frame),
+                mul, grid=(0, 0, 0) if grid else None
+            ),
+            np.uint8
+        )
+
+
+def soup(size, rule, n_states):
+    rows = (''.join(random.choice('.ABCDEFGH'[:n_states]) for _ in range(size)) for _ in range(size))
+    if n_states < 3:
+        rows = (row.replace('.', 'b').replace('A', 'o') for row in rows)
+    return f'x = {size}, y = {size}, rule = {rule}\n' + '$'.join(rows) + '!\n'
+
+
+def simulate(tmp, size, gens, rule, algo, n_states):
+    current = os.path.join(tmp, 'bench')
+    with open(f'{current}_in.rle', 'w') as f:
+        f.write(soup(size, rule, n_states))
+    subprocess.run(
+        [BGOLLY, '-a', algo, '-r', rule, '-m', str(gens), '-i', '1', '-o', f'{current}_out.rle', f'{current}_in.rle'],
+        check=True, stdout=subprocess.DEVNULL
+    )
+    return current
+
+
+def timed(frames):
+    start = time.perf_counter()
+    for _ in frames:
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=500)
+    parser.add_argument('--gens', type=int, default=300)
+    parser.add_argument('--rule', default='B3/S23')
+    parser.add_argument('--grid', action='store_true')
+    args = parser.parse_args()
+
+    n_states = int(args.rule.split('/')[-1]) if args.rule.count('/') > 1 else 2
+    algo = 'Generations' if n_states > 2 else 'QuickLife'
+    bg = (54, 57, 62)
+    colors = mutils.ColorRange(n_states).to_dict() if n_states > 2 else {'o': (255, 255, 255), 'b': bg}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        current = simulate(tmp, args.size, args.gens, args.rule, algo, n_states)
+        bbox, trackmaxes, n_frames, _ = ca.scan_frames(f'{current}_out.rle')
+        render_args = bbox, colors, bg, False, trackmaxes, args.grid
+        print(f'{n_frames} frames, bbox {bbox[2]}x{bbox[3]}')
+
+        def frames():
+            return ca.iter_frames(f'{current}_out.rle')
+
+        before = timed(legacy_rasterize(frames(), *render_args))
+        after = timed(ca.rasterize(frames(), *render_args))
+        print(f'rasterize  before {before:8.3f}s  after {after:8.3f}s  ({before / after:.1f}x)')
+        matched = sum(
+            np.array_equal(old, new)
+            for old, new in zip(legacy_rasterize(frames(), *render_args), ca.rasterize(frames(), *render_args))
+        )
+        print(f'pixel-identical frames: {matched}/{n_frames}')
+
+        start = time.perf_counter()
+        ca.merge_frames(current, False)
+        _, stages, _ = ca.makeframes(current, n_frames - 1, 1, bbox, n_frames, 0, colors, bg, False, trackmaxes, args.grid)
+        print(f'makeframes (incl. GIF encoding) {time.perf_counter() - start:8.3f}s')
+        for name, (busy, stall) in zip(('decode', 'paint', 'encode'), stages):
+            print(f'  {name:8} busy {busy:8.3f}s  stalled {stall:8.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,41 @@
 import asyncio
 import concurrent
 import datetime as dt
+import hashlib
 import io
 import json
 import marshal
 import math
-import operator
+import multiprocessing
 import os
-import random
 import re
+import shutil
 import subprocess
 import time
 import types
 from collections import deque
+from contextlib import asynccontextmanager
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from enum import Enum
+from functools import lru_cache
 from itertools import count, islice, starmap
 
 import aiohttp
 import discord
-import imageio
 import numpy as np
-from PIL import ImageFile
+from PIL import Image, ImageDraw, ImageFile, ImageFont
 from discord.ext import commands
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
-from cogs.resources import mutils
+from cogs.resources import engines, framestore, mutils
+from cogs.resources.cache import DiskCache, digest
+from cogs.resources.rulecache import RuleCache
+from cogs.resources.rulestore import RuleStore
+from cogs.resources.gif import GIFWriter
+from cogs.resources.rle import (
+    STATE_CHARS, decode_rle, encode_rle, parse_pattern, parse_plaintext, pattern_population, rle_runs
+)
 from cogs.nakano import *
 
 
@@ -48,6 +57,98 @@ class Status(Enum):
     FAILED = 4
 
 
+class Job:
+    __slots__ = 'user', 'guild', 'cost', 'log', 'seq', 'queued_at', 'started_at', 'ready'
+
+    def __init__(self, user, guild, cost, log, seq):
+        self.user = user
+        self.guild = guild
+        self.cost = cost
+        self.log = log
+        self.seq = seq
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.ready = asyncio.get_event_loop().create_future()
+
+
+class Scheduler:
+    """
+    Hands out a fixed number of simulation slots. When one frees up, the waiting
+    job that goes next is the one whose user, and then whose guild, has the fewest
+    jobs already running; among those, the cheapest, with every AGING seconds spent
+    waiting counting as much as halving a job's cost so that big jobs still get a turn.
+    """
+    AGING = 30
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.running = []
+        self.waiting = []
+        self.mean_duration = 30.0  # seconds a slot is held for, as a moving average
+        self._seq = count()
+
+    def _priority(self, job, now):
+        return (
+            sum(other.user == job.user for other in self.running),
+            sum(other.guild == job.guild for other in self.running),
+            math.log2(max(1, job.cost)) - (now - job.queued_at) / self.AGING,
+            job.seq
+        )
+
+    def queued(self):
+        """Waiting jobs in the order they'd be started if slots freed up now"""
+        now = time.monotonic()
+        return sorted(self.waiting, key=lambda job: self._priority(job, now))
+
+    def eta(self, position):
+        """Rough number of seconds until the job at `position` in the queue starts"""
+        now = time.monotonic()
+        frees = sorted(max(0.0, self.mean_duration - (now - job.started_at)) for job in self.running)
+        frees += [0.0] * (self.slots - len(frees))
+        return frees[position % self.slots] + (position // self.slots) * self.mean_duration
+
+    def _dispatch(self):
+        while self.waiting and len(self.running) < self.slots:
+            job = self.queued()[0]
+            self.waiting.remove(job)
+            self.running.append(job)
+            job.started_at = time.monotonic()
+            if job.log is not None:
+                job.log.status = Status.SIMMING
+            job.ready.set_result(None)
+
+    def _release(self, job):
+        self.running.remove(job)
+        self.mean_duration += (time.monotonic() - job.started_at - self.mean_duration) / 5
+        self._dispatch()
+
+    def enqueue(self, user, guild, cost, log=None):
+        job = Job(user, guild, cost, log, next(self._seq))
+        self.waiting.append(job)
+        self._dispatch()
+        return job
+
+    def withdraw(self, job):
+        """Takes `job` out of the queue, or gives up its slot if it's been handed one"""
+        if job in self.waiting:
+            self.waiting.remove(job)
+        elif job in self.running:
+            self._release(job)
+
+    @asynccontextmanager
+    async def slot(self, job):
+        """Waits for `job`'s turn, holding a slot for the duration of the block"""
+        try:
+            await job.ready
+        except asyncio.CancelledError:
+            self.withdraw(job)
+            raise
+        try:
+            yield job
+        finally:
+            self._release(job)
+
+
 # MOD_ROLE_IDS = {
 #   441021286253330432,  # admin
 #   358487842755969025,  # mod
@@ -116,8 +217,61 @@ rXRLE = re.compile(
 rRUNS = re.compile(r'([0-9]*)([a-z][A-Z]|[ob.A-Z])')
 # [rRUNS.sub(lambda m: '10'[m[2] == 'b'] * int(m[1] or 1), pattern) for pattern in patlist[i]]
 
-# unrolls $ signs
-rDOLLARS = re.compile(r'(\d+)\$')
+# matches position and bbox lines in simulator output
+rPAIR = re.compile(rb'(-?\d+),(-?\d+)')
+
+# position bgolly reports for an empty pattern
+EMPTY_POS = (-2147483648, -2147483648)
+
+# simulations allowed to run at once; the rest wait their turn in CA.scheduler
+SIM_SLOTS = max(1, (os.cpu_count() or 2) // 2)
+
+# disk space for finished GIFs, so repeat sims of the same thing skip simulating and rendering;
+# bump GIF_CACHE_VERSION whenever a change to either would make cached GIFs look different
+GIF_CACHE_BYTES = int(os.getenv('GIF_CACHE_BYTES', 256 * 1024 * 1024))
+GIF_CACHE_VERSION = 2
+
+# rule files fetched from the wiki, kept on disk and refetched once they're older than
+# RULE_CACHE_TTL seconds, or RULE_MISS_TTL for rules the wiki turned out not to have
+RULE_CACHE_BYTES = int(os.getenv('RULE_CACHE_BYTES', 32 * 1024 * 1024))
+RULE_CACHE_TTL = int(os.getenv('RULE_CACHE_TTL', 60 * 60))
+RULE_MISS_TTL = int(os.getenv('RULE_MISS_TTL', 5 * 60))
+# how long a rule file bgolly was given stays on disk after the last sim using it
+RULE_STORE_AGE = int(os.getenv('RULE_STORE_AGE', 24 * 60 * 60))
+
+# most rules lifelib compiles or has waiting to be compiled at once, each taking about a
+# minute of a core; more are left to bgolly until there's room, and 0 turns compiling off
+LIFELIB_COMPILES = int(os.getenv('LIFELIB_COMPILES', 4))
+
+# largest soup `sim rand` makes, per side; rules the bitboard engine runs can go much bigger
+MAX_SOUP = 1500
+MAX_BITBOARD_SOUP = 4096
+
+# most generations of a 1D rule drawn in one image, and most cells it can take up, which
+# is checked against how far the rule could spread before any of it is worked out
+MAX_SPACETIME_ROWS = 1 << 12
+MAX_SPACETIME_CELLS = 1 << 24
+
+# Golly's algos that hash, so can jump far ahead quickly for -exp timelines and read
+# macrocell; QuickLife sims use HashLife instead
+HASHING_ALGOS = {'HashLife', 'Generations', 'RuleLoader'}
+# how long each frame of a timeline stays up, long enough to read its generation
+TIMELINE_FRAME_SECONDS = 0.5
+
+# drawn along cell edges by -g
+GRID_COLOR = (0, 0, 0)
+
+# GIFs are cut off once they pass MAX_GIF_BYTES, to stay under Discord's 8MB upload limit;
+# renders are planned to come in under GIF_BUDGET, leaving headroom for misestimates
+MAX_GIF_BYTES = 7500000
+GIF_BUDGET = 6000000
+# frames that would have more pixels than this at a cell a pixel are zoomed out instead,
+# each pixel standing for a square block of cells
+MAX_FRAME_PIXELS = 1 << 22
+# shades between the background and live cells that -density draws zoomed-out blocks in
+DENSITY_SHADES = 16
+# -final sends the pattern itself instead, under the same limit
+MAX_PATTERN_BYTES = MAX_GIF_BYTES
 
 # matches *.rule files
 rRULE = re.compile(
@@ -168,76 +322,610 @@ class Trackbox:
         )
 
 
-def _replace(m):
-    return '$' * int(m[1])
-
+def parse_pair(line):
+    """Strictly parses a position or bbox line of simulator output, e.g. b'-3,14' -> (-3, 14)"""
+    rmatch = rPAIR.fullmatch(line)
+    if rmatch is None:
+        raise ValueError(f'Malformed line in simulator output: {line[:50]!r}')
+    return int(rmatch[1]), int(rmatch[2])
+
+
+def parse_color(line, colors):
+    """
+    '1    255 0 0   random comments' ->
+    colors['A'] = colors['o'] = (255, 0, 0)
+    """
+    state, rgb = line.split(None, 1)
+    state, rgb = int(state), tuple(map(int, rgb.split()[:3]))
+    if state == 0:
+        colors['.'] = colors['b'] = rgb
+    elif state == 1:
+        colors['A'] = colors['o'] = rgb
+    else:
+        colors[mutils.state_from(state)] = rgb
+
+
+def frames_path(current):
+    """Where the sim's frames are kept: a frame store if an engine simulated them, simulator output otherwise"""
+    path = f'{current}_frames.bin'
+    return path if os.path.exists(path) else f'{current}_frames.rle'
+
+
+def scan_frames(path, every=1):
+    """
+    Cheap first pass over simulator output, reading only each frame's position
+    and bbox lines (and any @COLOR section) without decoding the frames themselves.
+    Returns the bounding box that covers every `every`th frame, the largest such
+    frame's width and height, the total number of frames, and any colors found.
+    """
+    if path.endswith('.bin'):
+        return framestore.scan(path, every)
+    xmin = ymin = math.inf
+    xmax = ymax = -math.inf
+    maxwidth = maxheight = n_frames = 0
+    colors, in_colors, field = {}, False, 0
+    with open(path, 'rb') as file:
+        for line in file:
+            if in_colors:
+                if line.strip():
+                    parse_color(line.decode(), colors)
+                continue
+            if b'@COLOR' in line:
+                in_colors = True
+                continue
+            if line[:1].isspace():
+                continue
+            if field == 0:
+                # Position of the pattern's top-left corner
+                pos = parse_pair(line.rstrip())
+                x, y = (0, 0) if pos == EMPTY_POS else pos
+            elif field == 1:
+                # Width and height of its bounding box
+                width, height = parse_pair(line.rstrip())
+                if n_frames % every:
+                    field = 2
+                    continue
+                xmin, ymin = min(xmin, x), min(ymin, y)
+                xmax, ymax = max(xmax, x + width), max(ymax, y + height)
+                maxwidth, maxheight = max(maxwidth, width), max(maxheight, height)
+            else:
+                n_frames += 1
+            field = (field + 1) % 3
+    if not n_frames:
+        raise ValueError('Simulator output contains no frames')
+    # Bounding box: top-left x and y, width and height
+    return (xmin, ymin, xmax - xmin, ymax - ymin), (maxwidth, maxheight), n_frames, colors
+
+
+def iter_frames(path):
+    """
+    Yields (rle, position) for each frame of simulator output, reading one frame at a time;
+    for a frame store, the frames are state grids instead
+    """
+    if path.endswith('.bin'):
+        yield from framestore.iterate(path)
+        return
+    fields = []
+    with open(path, 'rb') as file:
+        for line in file:
+            if b'@COLOR' in line:
+                return
+            if line[:1].isspace():
+                continue
+            fields.append(line.rstrip())
+            if len(fields) == 3:
+                pos, _, rle = fields
+                pos = parse_pair(pos)
+                yield rle, (0, 0) if pos == EMPTY_POS else pos
+                fields = []
+
+
+def build_palette(colors, bg):
+    """
+    Lookup table mapping state numbers to RGB colors.
+    The final entry is reserved for grid lines.
+    """
+    rgb = {STATE_CHARS[char]: color for char, color in colors.items() if char in STATE_CHARS}
+    if 'o' in colors:  # two-state output is written with o/b, so 'o' takes precedence over 'A'
+        rgb[1] = colors['o']
+    rgb[0] = bg
+    return np.array([rgb.get(state, bg) for state in range(1 + max(rgb))] + [GRID_COLOR], np.uint8)
+
+
+def upscale_factor(width, height, target=100):
+    """How much to blow up each cell so that the shorter side of the image is at least `target` pixels"""
+    anchor = min(height, width)
+    return -(-target // anchor) if anchor <= target else 1
+
+
+def estimate_gif_size(rle_bytes, n_frames, mul, n_colors):
+    """
+    Rough size in bytes of the GIF that makeframes will write, given the size
+    of the simulator output it's rendered from. Output size tracks how busy the
+    frames are much better than it does the bounding box, and delta frames
+    grow about linearly with `mul` since upscaled rows repeat; the coefficients
+    are fitted against renders of random soups, which they match within ~40%.
+    """
+    return rle_bytes * mul * (0.16 + 0.08 * math.log2(max(2, n_colors))) + 20 * n_frames
+
+
+def fit_budget(rle_bytes, n_frames, mul, min_mul, n_colors, budget=GIF_BUDGET):
+    """
+    Picks the largest scale factor, no smaller than `min_mul`, and then the smallest
+    stride through the frames (i.e. multiple of the step) whose GIF is expected to
+    fit in `budget`. Returns (mul, stride).
+    """
+    for new_mul in range(mul, min_mul - 1, -1):
+        if estimate_gif_size(rle_bytes, n_frames, new_mul, n_colors) <= budget:
+            return new_mul, 1
+    for stride in range(2, n_frames):
+        kept = -(-n_frames // stride)
+        if estimate_gif_size(rle_bytes * kept / n_frames, kept, min_mul, n_colors) <= budget:
+            return min_mul, stride
+    return min_mul, max(1, n_frames - 1)
+
+
+def zoom_factor(width, height, budget=MAX_FRAME_PIXELS):
+    """
+    Smallest block size that shows a `width`-by-`height` grid, a block a pixel, in at
+    most `budget` pixels and no more than the 65535 a GIF can have on a side
+    """
+    zoom = max(1, math.isqrt(width * height // budget), -(-max(width, height) // 65535))
+    while -(-width // zoom) * -(-height // zoom) > budget:
+        zoom += 1
+    return zoom
+
+
+def reduce_grid(cells, zoom, density, top=0, left=0):
+    """
+    Shrinks a state grid `zoom` times each way, each block becoming its highest state,
+    or if `density` its number of live cells. The grid starts `top` rows and `left`
+    columns into its first row and column of blocks.
+    """
+    height, width = cells.shape
+    padded = np.pad(cells, ((top, -(top + height) % zoom), (left, -(left + width) % zoom)))
+    # Rows of blocks first, so each reduction runs along whole rows, then each row's blocks
+    bands = padded.reshape(padded.shape[0] // zoom, zoom, padded.shape[1])
+    edges = np.arange(0, padded.shape[1], zoom)
+    if density:
+        return np.add.reduceat((bands != 0).sum(1, dtype=np.int32), edges, 1)
+    return np.maximum.reduceat(bands.max(1), edges, 1)
+
+
+def reduce_rle(rle, canvas, zoom, density, dx, dy):
+    """
+    Same as decode_rle, onto a canvas `zoom` times smaller each way than the pattern's,
+    whose blocks each get the highest state in them, or if `density` have their live
+    cells added up. Runs are split where they cross from block to block, without ever
+    being drawn out a cell at a time.
+    """
+    rows, cols, counts, states = rle_runs(rle)
+    if not counts.size:
+        return
+    starts = dx + cols
+    ends = starts + counts
+    first, last = starts // zoom, (ends - 1) // zoom
+    # One piece per block each run touches
+    pieces = last - first + 1
+    run = np.repeat(np.arange(counts.size), pieces)
+    block = first[run] + np.arange(run.size) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    flat = (dy + rows[run]) // zoom * canvas.shape[1] + block
+    if density:
+        overlap = np.minimum(ends[run], (block + 1) * zoom) - np.maximum(starts[run], block * zoom)
+        canvas += np.bincount(flat, overlap, canvas.size).astype(canvas.dtype).reshape(canvas.shape)
+    else:
+        np.maximum.at(canvas.ravel(), flat, states[run].astype(canvas.dtype))
+
+
+def density_palette(palette, bg):
+    """Palette for -density: the background, then shades up to the first live state's color, then grid lines"""
+    fraction = np.arange(1 + DENSITY_SHADES)[:, None] / DENSITY_SHADES
+    shades = np.asarray(bg) * (1 - fraction) + palette[1] * fraction
+    return np.concatenate([shades.round().astype(np.uint8), palette[-1:]])
+
+
+def upscale(frame, mul, grid=None):
+    """
+    Blows each cell up into a `mul`-by-`mul` block.
+    If `grid` is given, the top and left edges of every block are set to it.
+    """
+    if mul == 1:
+        return frame
+    height, width = frame.shape
+    scaled = np.broadcast_to(frame[:, None, :, None], (height, mul, width, mul)).reshape(height * mul, width * mul)
+    if grid is not None:
+        scaled[::mul] = grid
+        scaled[:, ::mul] = grid
+    return scaled
+
+
+class Raster:
+    """
+    Decodes frames onto a fixed canvas and paints them, upscaled so that small patterns
+    stay legible. Patterns too big to show a cell a pixel within MAX_FRAME_PIXELS are
+    zoomed out like Golly does, each pixel showing the highest state in a block of
+    cells, or with `density`, shaded by how many of the block's cells are alive.
+    """
+    def __init__(self, bbox, colors, bg, track, trackmaxes, grid, mul=None, density=False):
+        self.xmin, self.ymin, width, height = bbox
+        if track:
+            width, height = trackmaxes
+        self.track = track
+        self.zoom = zoom_factor(2 + width, 2 + height)
+        self.density = density and self.zoom > 1
+        if self.zoom > 1:
+            mul, grid = 1, False  # grid lines would cover the whole image
+        self.mul = upscale_factor(width, height) if mul is None else mul
+        self.palette = build_palette(colors, bg)
+        if self.density:
+            self.palette = density_palette(self.palette, bg)
+        self.grid = len(self.palette) - 1 if grid else None
+        if len(self.palette) > 256:
+            # All 256 states are in use, leaving no room for a grid color: borrow the closest state's
+            self.palette = self.palette[:-1]
+            if grid:
+                self.grid = np.abs(self.palette.astype(int) - GRID_COLOR).sum(1).argmin()
+        self.shape = -(-(2 + height) // self.zoom), -(-(2 + width) // self.zoom)
+        self.size = self.mul * self.shape[1], self.mul * self.shape[0]
+
+    def decode(self, frames):
+        """Yields a fresh state grid (of palette indices, with `density`) for each (rle or state grid, position) frame"""
+        zoom = self.zoom
+        for frame, (xpos, ypos) in frames:
+            dx, dy = (1, 1) if self.track else (1 + (xpos - self.xmin), 1 + (ypos - self.ymin))
+            canvas = np.zeros(self.shape, np.intp if self.density else np.uint8)
+            if zoom == 1 and isinstance(frame, np.ndarray):
+                canvas[dy:dy + frame.shape[0], dx:dx + frame.shape[1]] = frame
+            elif zoom == 1:
+                decode_rle(frame, canvas, dx, dy)
+            elif isinstance(frame, np.ndarray):
+                blocks = reduce_grid(frame, zoom, self.density, dy % zoom, dx % zoom)
+                canvas[dy // zoom:dy // zoom + blocks.shape[0], dx // zoom:dx // zoom + blocks.shape[1]] = blocks
+            else:
+                reduce_rle(frame, canvas, zoom, self.density, dx, dy)
+            if self.density:
+                # Any live cell at all shows up as the faintest shade
+                canvas = (-(-canvas * DENSITY_SHADES // zoom ** 2)).astype(np.uint8)
+            yield canvas
+
+    def paint(self, canvas):
+        """State grid -> upscaled image of palette indices"""
+        return upscale(canvas, self.mul, self.grid)
+
+
+def rasterize(frames, bbox, colors, bg, track, trackmaxes, grid, density=False):
+    """Yields each (rle, position) frame as an RGB image"""
+    raster = Raster(bbox, colors, bg, track, trackmaxes, grid, density=density)
+    return (raster.palette[raster.paint(canvas)] for canvas in raster.decode(frames))
+
+
+def last_frame(path, size=False):
+    """
+    (rle, position) of the final frame of simulator output, read from the end of the
+    file; if `size`, (rle, position, (width, height))
+    """
+    with open(path, 'rb') as file:
+        end = file.seek(0, os.SEEK_END)
+        tail = 1 << 16
+        while True:
+            start = max(0, end - tail)
+            file.seek(start)
+            lines = [line.rstrip() for line in file.read(end - start).splitlines()]
+            # The first line read may be cut off partway, so make sure there's one to spare
+            lines = [line for line in lines if line and not line[:1].isspace()]
+            if len(lines) > 3 or start == 0:
+                break
+            tail *= 4
+    pos, bbox, rle = lines[-3:]
+    pos = parse_pair(pos)
+    pos = (0, 0) if pos == EMPTY_POS else pos
+    return (rle, pos, parse_pair(bbox)) if size else (rle, pos)
+
+
+def write_checkpoint_input(current, rule):
+    """Writes the last frame simmed so far as `current`_resume.rle, at its original position"""
+    rle, (x, y) = last_frame(f'{current}_frames.rle')
+    with open(f'{current}_resume.rle', 'wb') as file:
+        file.write(b'#CXRLE Pos=%d,%d\nx = 0, y = 0, rule = %s\n%s\n' % (x, y, rule.encode(), rle))
+
+
+def merge_frames(current, resume):
+    """
+    Moves new simulator output into `current`_frames.rle, which keeps every frame of
+    the sim so far. When resuming, the output's first frame is the previous run's
+    last and is dropped.
+    """
+    if not resume:
+        os.replace(f'{current}_out.rle', f'{current}_frames.rle')
+        return
+    with open(f'{current}_out.rle', 'rb') as new, open(f'{current}_frames.rle', 'ab') as frames:
+        skip = 3
+        for line in new:
+            if skip and line.strip() and not line[:1].isspace():
+                skip -= 1
+            elif not skip:
+                frames.write(line)
+    os.remove(f'{current}_out.rle')
 
-def parse(lines, current):
-    patlist = [x.strip("\n") for x in lines if re.match("\\S+", x)]
 
+def timeline_gens(gen, ratio=2):
+    """Generation 0, then each power of `ratio` (rounded) below `gen`, then `gen`"""
+    gens, power = [0], 1
+    while power < gen:
+        if round(power) > gens[-1]:
+            gens.append(round(power))
+        power *= ratio
+    return gens + [gen] * (gen > gens[-1])
+
+
+@lru_cache(256)
+def label_mask(text):
+    """Which pixels `text` covers in PIL's default font, with a margin around it"""
+    font = ImageFont.load_default()
+    _, _, right, bottom = font.getbbox(text)
+    image = Image.new('L', (right + 4, bottom + 4))
+    ImageDraw.Draw(image).text((2, 2), text, 255, font)
+    return np.asarray(image) > 127
+
+
+def draw_label(frame, text, color):
+    """Writes `text` in palette index `color` over the top-left corner of a painted frame, on the background"""
+    mask = label_mask(text)[:frame.shape[0], :frame.shape[1]]
+    frame[:mask.shape[0], :mask.shape[1]] = np.where(mask, color, 0)
+    return frame
+
+
+def makeframes(
+        current, gen, step, bbox, n_frames, pad, colors, bg, track, trackmaxes, grid, resume=None, every=1, labels=None,
+        density=False
+):
+    """
+    Renders every `every`th frame of the sim (see frames_path) to `current`.gif, decoding,
+    rasterizing and encoding them concurrently so that output is written while input
+    is still being read. `step` is the step the frames were simulated at.
+
+    If the GIF looks like it'll be too large to upload, the scale is lowered (to no
+    less than half the usual) and then frames are skipped, before anything's rendered.
+    If `resume` describes the render of a shorter run of the same sim and nothing about
+    the layout has changed since, only the new frames are rendered and added to its GIF.
+
+    If given, `labels` are written on each frame (and can't be combined with `resume`).
+    Patterns too big to show a cell a pixel are zoomed out (see Raster), with `density`
+    shading.
+
+    Returns the stride through the frames, whether the scale was lowered, and whether
+    the GIF still had to be truncated; each stage's (busy, stall) times; and a
+    description of this render to resume from next time.
+    """
+    path = frames_path(current)
+    raster = Raster(bbox, colors, bg, track, trackmaxes, grid, density=density)
+    width, height = trackmaxes if track else bbox[2:]
+    kept = -(-n_frames // every)
+    size = framestore.rle_size(path) if path.endswith('.bin') else os.path.getsize(path)
+    mul, stride = fit_budget(
+        # Zooming out merges rows as well as runs within them
+        size * kept / n_frames / raster.zoom ** 2, kept,
+        raster.mul, 1 if raster.zoom > 1 else upscale_factor(width, height, 50), len(raster.palette)
+    )
+    downscaled = mul < raster.mul
+    if downscaled:
+        raster = Raster(bbox, colors, bg, track, trackmaxes, grid, mul, density)
+    duration = min(1 / 6, max(1 / 60, 5 / gen / (step * every * stride)) if gen else 1)
+    if labels is not None:
+        duration = TIMELINE_FRAME_SECONDS
+    # Stride through the frames as simulated, as opposed to the one chosen to fit the budget
+    total_stride = every * stride
+    # Everything that has to match for new frames to be added to an existing GIF
+    layout = (
+        mul, raster.zoom, total_stride, duration, raster.shape, None if track else bbox[:2], raster.palette.tobytes()
+    )
+    render = {'layout': layout, 'n_frames': n_frames}
+    resume = resume is not None and resume['layout'] == layout and not resume['oversized'] and resume
+    frames = iter_frames(path)
+    try:
+        if resume:
+            # Start from the last frame already in the GIF, which the first new one is a delta from
+            canvases = raster.decode(
+                islice(frames, (resume['n_frames'] - 1) // total_stride * total_stride, None, total_stride)
+            )
+            previous = raster.paint(next(canvases))
+        else:
+            canvases = raster.decode(islice(frames, 0, None, total_stride))
+        paint = raster.paint
+        if labels is not None:
+            # in whichever color stands out most from the background
+            color = int(np.abs(raster.palette.astype(int) - raster.palette[0]).sum(1).argmax())
+            canvases = zip(canvases, islice(labels, 0, None, total_stride))
+            paint = lambda item: draw_label(raster.paint(item[0]), item[1], color)
+        with GIFWriter(
+                f'{current}.gif', *raster.size, raster.palette, duration=duration, delta=True, resume=bool(resume)
+        ) as gif_writer:
+            if resume:
+                gif_writer.previous = previous
+
+            def encode(frame):
+                gif_writer.append(frame)
+                return gif_writer.bytes_written > MAX_GIF_BYTES
+
+            oversized, stages = mutils.pipeline(canvases, paint, encode)
+        render['oversized'] = bool(oversized)
+        return (stride, downscaled, bool(oversized)), stages, render
+    finally:
+        frames.close()
+
+
+def read_attachment(path):
+    """
+    Reads a pattern file downloaded to `path`. Returns its format (see
+    mutils.pattern_header), the rule it names or None, the pattern, and whether the
+    in-process engines can have it: macrocell is left to bgolly's hashing algos, which
+    keep its compression, as is anything whose bounding box is too big to hold as a
+    grid. Those bgolly reads from the file itself, so they aren't read in at all and
+    come back as None. Plaintext comes back as the body of an RLE file.
+    """
+    file_format, rule, size = mutils.pattern_header(path)
+    if file_format == 'mc' or size is not None and size[0] * size[1] > engines.MAX_CELLS:
+        return file_format, rule, None, False
+    with open(path, errors='replace') as file:
+        text = file.read()
+    if file_format == 'cells':
+        cells, _ = parse_plaintext(text)
+        text = encode_rle(cells) + '\n'
+    return file_format, rule, text, True
+
+
+def file_digest(path):
+    """Hex SHA-256 of the file at `path`, read a chunk at a time"""
+    with open(path, 'rb') as file:
+        return hashlib.file_digest(file, 'sha256').hexdigest()
+
+
+def rename_rule(path, rule):
+    """
+    Rewrites the rule named in the header of the RLE or macrocell file at `path` as
+    `rule`, copying the rest of it across unread
+    """
+    with open(path, 'rb') as source, open(f'{path}.tmp', 'wb') as dest:
+        for line in source:
+            if line.startswith(b'#R'):
+                dest.write(b'#R %s\n' % rule.encode())
+            elif rmatch := mutils.rRLE_HEADER.match(line.decode(errors='replace')):
+                dest.write(f'x = {rmatch[1]}, y = {rmatch[2]}, rule = {rule}\n'.encode())
+                break
+            else:
+                dest.write(line)
+                if not line.startswith((b'#', b'[M2]')):
+                    break
+        shutil.copyfileobj(source, dest)
+    os.replace(f'{path}.tmp', path)
+
+
+def leaf_macrocell(path):
+    """
+    Rewrites the two-state macrocell file at `path` in the form Golly's HashLife reads,
+    whose smallest nodes are 8x8 bitmaps, if it's in the form lifelib (or Golly, for
+    multistate rules) writes, whose smallest are 2x2 cells. Nodes are copied across a
+    line at a time, only the ones 8x8 and smaller being held as bitmaps.
+    """
+    # node number -> rows as bitmasks, leftmost cell highest, for nodes up to 8x8,
+    # and the number of the line written for each bigger one; node 0 is empty
+    nodes, written, depth = [None], 0, 0
+    with open(path) as source, open(f'{path}.tmp', 'w') as dest:
+        for line in source:
+            if line.startswith(('[', '#')) or not line.strip():
+                dest.write(line)
+                continue
+            if line[0] in '.*$':
+                break  # already in HashLife's form
+            depth, *children = map(int, line.split())
+            if depth > 3:
+                dest.write(f'{depth} {" ".join(str(nodes[child] if child else 0) for child in children)}\n')
+                written += 1
+                nodes.append(written)
+                continue
+            if depth == 1:
+                nw, ne, sw, se = ([bool(state)] for state in children)
+            else:
+                size = 1 << depth - 1
+                nw, ne, sw, se = (nodes[child] if child else [0] * size for child in children)
+            rows = [left << (1 << depth - 1) | right for left, right in [*zip(nw, ne), *zip(sw, se)]]
+            nodes.append(rows)
+            if depth == 3:
+                dest.write(leaf_line(rows))
+                written += 1
+                nodes[-1] = written
+        else:
+            if 0 < depth < 3:
+                # The whole pattern fits in a node smaller than a leaf
+                size = 1 << depth
+                dest.write(leaf_line([row << 8 - size for row in nodes[-1]] + [0] * (8 - size)))
+            os.replace(f'{path}.tmp', path)
+            return
+    os.remove(f'{path}.tmp')
+
+
+def leaf_line(rows):
+    """An 8x8 macrocell leaf, given as eight rows of bitmasks, as a line of HashLife macrocell"""
+    return ''.join(f'{row:08b}'.rstrip('0').replace('0', '.').replace('1', '*') + '$' for row in rows) + '\n'
+
+
+def send_simulation(connection, function, *args):
+    """Runs function(*args), engines.simulate or the like, and sends back what it returns, for CA.simulate_apart"""
+    connection.send(function(*args))
+    connection.close()
+
+
+def save_final(current, rule, gen, max_bytes, writrule=None):
+    """
+    Same as engines.simulate_final, for simulator output in `current`_out.rle: writes
+    its last frame to `current`_final.rle, and returns the same summary. Given
+    `writrule`, the rule as bgolly knows it, a frame too big to send is written to
+    `current`_big.rle all the same, for bgolly to rewrite as macrocell.
+    """
+    rle, (x, y), (width, height) = last_frame(f'{current}_out.rle', size=True)
     os.remove(f'{current}_out.rle')
-    # `positions` needs to be a list, not a generator
-    # because it's returned from this function, so
-    # it gets pickled by run_in_executor -- and
-    # generators can't be pickled
-    # [(0, 0), (-1, 1), (0, 0), (-1, -1), (1, -2), (0, -1), (2, -2), (1, -1), (0, -2), (-1, 1)]
-    positions = list(map(lambda x: eval(x) if x != '-2147483648,-2147483648' else (0, 0), patlist[::3]))
-    # [(5, 3), (7, 1), (5, 3), (7, 5), (3, 7), (5, 5), (1, 7), (3, 5), (5, 7), (7, 1)]
-    bboxes = list(map(eval, patlist[1::3]))
-
-    # trackbox = Trackbox.from_lists(positions, bboxes)
-
-    # Determine the bounding box to make gifs from
-    # The rectangle: xmin <= x <= xmax, ymin <= y <= ymax
-    # where (x|y)(min|max) is the min/max coordinate across all gens.
-    xmins, ymins = zip(*positions)
-    (widths, heights), maxwidth, maxheight = zip(*bboxes), max(w for w, h in bboxes), max(h for w, h in bboxes)
-    xmaxes = starmap(operator.add, zip(xmins, widths))
-    ymaxes = starmap(operator.add, zip(ymins, heights))
-    xmin, ymin, xmax, ymax = min(xmins), min(ymins), max(xmaxes), max(ymaxes)
-    # Bounding box: top-left x and y, width and height
-    bbox = xmin, ymin, xmax - xmin, ymax - ymin
-
-    # ['4b3$o', '3o2b'] -> ['4b$$$o', '3o2b']
-    # ['4b$$$o', '3o2b'] -> [['4b', '', '', '', 'o'], ['3o2b']]
-    return [i.replace('!', '').split('$') for i in
-            (rDOLLARS.sub(_replace, j) for j in patlist[2::3])], positions, bbox, (maxwidth, maxheight)
-
-
-def makeframes(current, gen, step, patlist, positions, bbox, pad, colors, bg, track, trackmaxes, grid):
-    xmin, ymin, width, height = bbox
-    if track:
-        width, height = trackmaxes
-    duration = min(1 / 6, max(1 / 60, 5 / gen / step) if gen else 1)
-    with imageio.get_writer(f'{current}.gif', mode='I', duration=str(duration)) as gif_writer:
-        for pat, (xpos, ypos) in zip(patlist, positions):
-            dx, dy = (1, 1) if track else (1 + (xpos - xmin), 1 + (ypos - ymin))
-            frame = [[bg] * (2 + width) for _ in range(2 + height)]
-
-            # Draw the pattern onto the frame by replacing segments of background rows
-            for i, flat_row in enumerate(
-                    [
-                        bg if char in '.b' else colors[char]
-                        for run, char in rRUNS.findall(row)
-                        for _ in range(int(run or 1))
-                    ]
-                    for row in pat
-            ):
-                frame[dy + i][dx:dx + len(flat_row)] = flat_row
-            anchor = min(height, width)
-            mul = -(-100 // anchor) if anchor <= 100 else 1
-            first_grid = 0 if grid else None
-            gif_writer.append_data(
-                np.asarray(
-                    mutils.scale(
-                        (mutils.scale(row, mul, grid=first_grid) for row in frame),
-                        mul, grid=(0, 0, 0) if grid else None
-                    ),
-                    np.uint8
-                ))
-            if os.stat(f'{current}.gif').st_size > 7500000:
-                return True
-    return False
+    rle = rle.split(b'!')[0]
+    population = int(rle_runs(rle)[2].sum())
+    if not population:
+        return 0, None, None
+    path = f'{current}_final.rle'
+    if len(rle) > max_bytes:
+        if writrule is None:
+            return population, (x, y, width, height), None
+        path, rule = f'{current}_big.rle', writrule
+    with open(path, 'wb') as file:
+        file.write(b'#CXRLE Pos=%d,%d Gen=%d\nx = %d, y = %d, rule = %s\n%s!\n' % (
+            x, y, gen, width, height, rule.encode(), rle
+        ))
+    return population, (x, y, width, height), None if path.endswith('_big.rle') else path
+
+
+def count_frames(path):
+    """How many frames of simulator output or a frame store have been written to `path` so far"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb') as file:
+        if path.endswith('.bin'):
+            return sum(1 for _ in framestore.headers(file))
+        return sum(1 for line in file if line.strip() and not line[:1].isspace()) // 3
+
+
+def render_spacetime(rule, pattern, gen, colors, bg, grid, path):
+    """
+    Draws a 1D pattern with its first `gen` generations one under another (see
+    engines.oned) as a single PNG at `path`, scaled up like GIF frames are.
+    Returns an error message if it couldn't or an empty string otherwise.
+    """
+    if gen > MAX_SPACETIME_ROWS:
+        return f'Error: Cannot draw more than {MAX_SPACETIME_ROWS} generations at once'
+    try:
+        cells, (x, y) = parse_pattern(pattern)
+    except ValueError as e:
+        return f'Error: {e}'
+    height, width = engines.oned.spacetime_bounds(rule, cells, gen)
+    if height * width > MAX_SPACETIME_CELLS:
+        return 'Error: Pattern could grow too large to render; try a lower GEN'
+    cells, x, y = engines.oned.spacetime(rule, cells, x, y, gen)
+    raster = Raster((x, y, *cells.shape[::-1]), colors, bg, False, None, grid)
+    canvas = next(raster.decode([(cells, (x, y))]))
+    Image.fromarray(raster.palette[raster.paint(canvas)]).save(path)
+    return ''
+
+
+def load_cached_gif(cache, key, path):
+    """Copies a GIF out of `cache` to `path`, returning how makeframes fit it to size, or None if absent"""
+    data = cache.get(key)
+    if data is None:
+        return None
+    fit, gif = data.split(b'\n', 1)
+    with open(path, 'wb') as f:
+        f.write(gif)
+    return tuple(json.loads(fit))
+
+
+def store_cached_gif(cache, key, path, fit):
+    with open(path, 'rb') as f:
+        cache.put(key, json.dumps(fit).encode() + b'\n' + f.read())
 
 
 def genconvert(gen: int):
@@ -252,45 +940,38 @@ class CA(commands.Cog):
         self.BOTS_N_MUTE = self.bot.get_channel(BOTS_N_MUTE)
         self.dir = os.path.dirname(os.path.abspath(__file__))
         self.ppe = ProcessPoolExecutor()
+        self.compiler = ProcessPoolExecutor(1)  # builds lifelib rules one at a time, in the background
+        self.compiling = set()  # rules compiling or waiting to
+        self.uncompilable = set()  # rules lifelib failed to compile, which aren't tried again
         self.tpe = ThreadPoolExecutor()  # or just None
         self.loop = bot.loop
         self.simlog = deque(maxlen=5)
+        self.scheduler = Scheduler(SIM_SLOTS)
+        self.gifcache = DiskCache(f'{self.dir}/resources/gifcache', GIF_CACHE_BYTES)
         self.defaults = (*[[self.ppe, 'ProcessPoolExecutor']] * 2, [self.tpe, 'ThreadPoolExecutor'])
         self.opts = {'tpe': [self.tpe, 'ThreadPoolExecutor'], 'ppe': [self.ppe, 'ProcessPoolExecutor']}
-        self.rulecache = None
+        self.rulecache = RuleCache(f'{self.dir}/resources/rulecache', RULE_CACHE_BYTES, RULE_CACHE_TTL, RULE_MISS_TTL)
+        self.rulestore = RuleStore(f'{self.dir}/resources/rulestore', RULE_STORE_AGE)
         self.gencache = None
         self.session = aiohttp.ClientSession()
 
     @staticmethod
-    def state_from(val, n_states):
-        if n_states < 3:
-            return 'bo'[val] if isinstance(val, int) else int(val == 'o')
-        return mutils.state_from(val)
-
-    def get_rand_state(self, n_states: int, last_state: str, allowed_states: {int}) -> str:
-        if last_state is None:
-            return self.state_from(random.randrange(0, n_states), n_states)
-        new = last_state = self.state_from(last_state, n_states)
-        while new == last_state or new not in allowed_states:
-            new = random.randrange(0, n_states)
-        return self.state_from(new, n_states)
-
-    def makesoup(self, rulestring: str, n_states: int, x: int, y: int, allowed_states: {int}) -> str:
-        """Generates random soup as RLE with specified dimensions"""
-        rle = f'x = {x}, y = {y}, rule = {rulestring}\n'
-        last_state = None
-        for row in range(y):
-            pos = x
-            while pos > 0:
-                # below could also just be random.randint(1,x) but something likes this gives natural-ish-looking results
-                runlength = math.ceil(-math.log(1 - random.random()))
-                if runlength > pos:
-                    runlength = pos  # or just `break`, no big difference qualitatively
-                last_state = self.get_rand_state(n_states, last_state, allowed_states)
-                rle += (str(runlength) if runlength > 1 else '') + last_state
-                pos -= runlength
-            rle += '$\n' if y > row + 1 else '!\n'
-        return rle
+    def makesoup(rulestring: str, n_states: int, x: int, y: int, allowed_states: {int}) -> str:
+        """
+        Generates random soup as RLE with specified dimensions: runs of cells ceil(Exp(1))
+        long, which gives natural-ish-looking results, each a different allowed state from
+        the one before. Built with NumPy so that soups thousands of cells across are quick.
+        """
+        rng = np.random.default_rng()
+        allowed = np.array(sorted(allowed_states), np.uint8)
+        # A run that long carries on past each cell with probability 1/e, so a new one
+        # starts at each cell with probability 1 - 1/e, and at the start of every row
+        new_run = rng.random((y, x)) < 1 - math.exp(-1)
+        new_run[:, 0] = True
+        # and moves on from the state before by a random nonzero number of allowed states
+        moves = np.where(new_run, rng.integers(1, allowed.size, (y, x)), 0).ravel()
+        cells = allowed[(rng.integers(allowed.size) + np.cumsum(moves)) % allowed.size].reshape(y, x)
+        return f'x = {x}, y = {y}, rule = {rulestring}\n' + encode_rle(cells, n_states < 3) + '\n'
 
     @staticmethod
     def _extend(n, *, thresh=50):
@@ -308,67 +989,480 @@ class CA(commands.Cog):
             return correct_emoji and (rxn.count > 3 or usr.id == WRIGHT)
         return correct_emoji
 
-    async def do_gif(self, execs, current, gen, step, colors, track, bg, grid):
-        # Getting colors
-        lines = []
-        in_colors = False
-        with open(f"{current}_out.rle", "r") as file:
-            for line in file.readlines():
-                line = line.rstrip('\n')
-                if "@COLOR" in line:
-                    in_colors = True
-                    continue
-                if in_colors:
-                    # '0    255 255 255   random comments' ->
-                    # {0: (255, 255, 255)}
-                    state, rgb = line.split(None, 1)
-
-                    if state == 0:
-                        colors['.'] = tuple(map(int, rgb.split()[:3]))
-                        colors['b'] = tuple(map(int, rgb.split()[:3]))
-                    elif state == 1:
-                        colors['A'] = tuple(map(int, rgb.split()[:3]))
-                        colors['o'] = tuple(map(int, rgb.split()[:3]))
-                    else:
-                        colors[chr(int(state) + 64)] = tuple(map(int, rgb.split()[:3]))
-                else:
-                    lines.append(line)
-
+    async def do_gif(
+            self, execs, current, gen, step, colors, track, bg, grid, resume=None, every=1, merge=True, density=False
+    ):
+        """
+        Renders the sim's frames, first folding in the simulator's new output if `merge`;
+        `step` is the step they were simulated at, and only every `every`th frame is used
+        """
         start = time.perf_counter()
-        patlist, positions, bbox, trackmaxes = await self.loop.run_in_executor(
-            execs[0][0], parse,
-            lines, current
+        if merge:
+            await self.loop.run_in_executor(None, merge_frames, current, resume is not None)
+        bbox, trackmaxes, n_frames, file_colors = await self.loop.run_in_executor(
+            execs[0][0], scan_frames,
+            frames_path(current), every
         )
-        end_parse = time.perf_counter()
-        oversized = await self.loop.run_in_executor(
+        colors.update(file_colors)
+        end_scan = time.perf_counter()
+        fit, stages, render = await self.loop.run_in_executor(
             execs[1][0], makeframes,
-            current, gen, step, patlist, positions, bbox,
+            current, gen, step, bbox, n_frames,
             len(str(gen)), colors, bg, track, trackmaxes,
-            grid
+            grid, resume, every, None, density
         )
         end_makeframes = time.perf_counter()
-        return start, end_parse, end_makeframes, oversized
+        render.update(gen=gen, step=step)
+        return {'scan': end_scan - start, 'render': end_makeframes - end_scan, 'stages': stages}, fit, render
 
-    async def run_bgolly(self, current, algo, gen, step, rule):
+    @staticmethod
+    def pattern_size(current, pat):
+        """
+        Size of a sim's pattern, for the scheduler to weigh it by: its RLE's, or if it's
+        been left in an attached file for bgolly, the file's
+        """
+        return len(pat) or os.path.getsize(f'{current}_in.rle')
+
+    @staticmethod
+    def discard_input(current):
+        """Removes `current`_in.rle, written for bgolly or downloaded from an attachment, if it's there"""
+        if os.path.exists(f'{current}_in.rle'):
+            os.remove(f'{current}_in.rle')
+
+    def discard_checkpoint(self, current):
+        for path in (f'{current}_frames.rle', f'{current}_frames.bin', f'{current}_resume.rle'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def fit_note(step, stride, downscaled, oversized):
+        """Tells the user how their GIF was cut down to size, if it was"""
+        changes = [f'step raised to {step * stride}'] * (stride > 1) + ['scale lowered'] * downscaled
+        note = f'\n({" and ".join(changes).capitalize()} to fit under 8MB)' if changes else ''
+        return note + ('\n(Truncated to fit under 8MB)' if oversized else '')
+
+    @staticmethod
+    def format_times(flags, execs, times):
+        if 'cache' in times:
+            if flags.get('time') == 'all':
+                return f'\nTimes:\n**Cache hit**: {round(times["cache"], 2)}s (not simulated or rendered)\n'
+            return f'{round(times["cache"], 2)}s (cached)' if 'time' in flags else ''
+        total = round(times['scan'] + times['render'], 2)
+        if flags.get('time') == 'all':
+            (decode, decode_stall), (paint, paint_stall), (encode, encode_stall) = times['stages']
+            choice = {'**Choosing algo**': times['choice']} if 'choice' in times else {}
+            return str(
+                {
+                    'Times': '',
+                    **choice,
+                    '**Scanning output**': f'{round(times["scan"], 2)}s ({execs[0][1]})',
+                    '**Rendering GIF**': f'{round(times["render"], 2)}s ({execs[1][1]})',
+                    '• Decoding frames': f'{round(decode, 2)}s busy / {round(decode_stall, 2)}s stalled',
+                    '• Rasterizing': f'{round(paint, 2)}s busy / {round(paint_stall, 2)}s stalled',
+                    '• Encoding': f'{round(encode, 2)}s busy / {round(encode_stall, 2)}s stalled',
+                    '(**Total**': f'{total}s)'
+                }
+            ).replace("'", '').replace(',', '\n').replace('{', '\n').replace('}', '\n')
+        return f'{total}s' if 'time' in flags else ''
+
+    async def run_bgolly(self, current, algo, gen, step, rule, infile=None, outfile=None):
+        """
+        Runs the simulator on `infile` (`current`_in.rle by default), writing to
+        `outfile` (`current`_out.rle by default; bgolly writes macrocell to a .mc file),
+        and returns its error output if it failed or an empty string otherwise
+        """
+        infile = infile or f'{current}_in.rle'
+        outfile = outfile or f'{current}_out.rle'
         # max_mem = int(os.popen('free -m').read().split()[7]) // 1.25 TODO: use
         timeout = 5 * 60
-        preface = f'{self.dir}/resources/bgolly'
         if '::' in rule:
             rule = f"{rule}_{current.split('/')[-1]}"
         algo = algo.split('::')[0]
-        ruleflag = f's {self.dir}/' if algo == 'RuleLoader' else f'r {rule}'
         if algo == "CAViewer":
-            preface = f'{self.dir}/resources/bin/CAViewer'
+            args = [
+                f'{self.dir}/resources/bin/CAViewer', 'sim',
+                '-g', str(gen), '-s', str(step), '-i', infile, '-o', outfile
+            ]
+        else:
+            ruleflag = ['-s', f'{self.rulestore.dir}/'] if algo == 'RuleLoader' else ['-r', rule]
+            args = [
+                f'{self.dir}/resources/bgolly', '-a', algo, *ruleflag,
+                '-m', str(gen), '-i', str(step), '-o', outfile, infile
+            ]
+        if os.path.exists(outfile):
+            # Left over from a run that failed or timed out, and bgolly appends rather than overwrites
+            os.remove(outfile)
+        try:
+            returncode, out, err = await mutils.run_process(*args, timeout=timeout)
+        except OSError as e:
+            return f'Error: Could not run {os.path.basename(args[0])} ({e.strerror})'
+        if returncode is None:
+            return f'Error: Timed out after {timeout // 60} minutes'
+        # bgolly reports errors on stdout, CAViewer on stderr
+        err = err if algo == "CAViewer" else out
+        return err or (f'Error: {os.path.basename(args[0])} exited with status {returncode}' if returncode else '')
+
+    async def simulate(self, current, engine, algo, gen, step, rule, pat, writrule, resume=False):
+        """
+        Simulates `pat` in-process with `engine`, or with `algo`'s simulator if that's None;
+        if `resume`, carries on from the last frame simmed so far. Returns any error message.
+        """
+        if engine is not None:
+            return await self.loop.run_in_executor(
+                self.ppe, engines.simulate,
+                engine, rule, pat, f'{current}_frames.bin', gen, step, resume
+            )
+        if not resume:
+            return await self.run_bgolly(current, algo, gen, step, rule)
+        await self.loop.run_in_executor(None, write_checkpoint_input, current, writrule)
+        return await self.run_bgolly(current, algo, gen, step, rule, infile=f'{current}_resume.rle')
 
-            p = subprocess.Popen(
-                f"timeout {timeout} {preface} sim -g {gen} -s {step} -i {current}_in.rle -o {current}_out.rle".split(),
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            out = p.communicate()
+    async def simulate_apart(self, function, engine, *args):
+        """
+        Runs function(engine, *args), engines.simulate or the like, in a process of its own,
+        which is killed if the awaiting task is cancelled. Returns what it returned, or an
+        error message if it crashed.
+        """
+        context = multiprocessing.get_context('fork')
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=send_simulation, args=(sender, function, engine, *args), daemon=True)
+        process.start()
+        sender.close()
+        exited = self.loop.create_future()
+        self.loop.add_reader(process.sentinel, lambda: exited.done() or exited.set_result(None))
+        try:
+            await exited
+        finally:
+            self.loop.remove_reader(process.sentinel)
+            if process.is_alive():
+                process.kill()
+            process.join()
+        return receiver.recv() if receiver.poll() else f'Error: {engine} crashed'
 
-            return out[1].decode("utf-8")
-        else:
-            return os.popen(
-                f'timeout {timeout} {preface} -a "{algo}" -{ruleflag} -m {gen} -i {step} -o {current}_out.rle {current}_in.rle').read()
+    async def probe(self, racers, prober, rule, pat, gen):
+        """
+        Has engines.probe() run `pat` a little with engine `prober` to pick between
+        `racers`' QuickLife and HashLife; returns the pick's engine and algo, and a note
+        on how it was made
+        """
+        if gen < engines.PROBE_MIN_GENS:
+            # which engines.probe() would only have said in a worker
+            engine, algo = racers['QuickLife']
+            return engine, algo, 'QuickLife without probing (too few generations to be worth it)'
+        start = time.perf_counter()
+        hashlife, reason = await self.loop.run_in_executor(self.ppe, engines.probe, prober, rule, pat, gen)
+        engine, algo = racers['HashLife' if hashlife else 'QuickLife']
+        return engine, algo, f'probe chose {algo} in {round(time.perf_counter() - start, 2)}s ({reason})'
+
+    async def race(self, current, racers, gen, step, rule, pat):
+        """
+        Simulates with each (engine, algo) of `racers` at once, keeping the output of
+        the first to finish without an error and killing the rest. Returns the winner's
+        key (None if they all failed), an error message if they did, and how it went.
+        """
+        start = time.perf_counter()
+        tasks, outputs = {}, {}
+        for name, (engine, algo) in racers.items():
+            if engine is None:
+                outputs[name] = f'{current}_{name}_out.rle'
+                coro = self.run_bgolly(f'{current}_{name}', algo, gen, step, rule, infile=f'{current}_in.rle')
+            else:
+                outputs[name] = f'{current}_{name}_frames.bin'
+                coro = self.simulate_apart(engines.simulate, engine, rule, pat, outputs[name], gen, step)
+            tasks[asyncio.ensure_future(coro)] = name
+        winner, err, pending = None, '', set(tasks)
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    err = task.result()
+                    if not err and winner is None:
+                        winner = tasks[task]
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        n_frames = 1 + -(-gen // step)
+        notes = []
+        for name, path in outputs.items():
+            if name == winner:
+                os.replace(path, f'{current}_out.rle' if racers[name][0] is None else f'{current}_frames.bin')
+                continue
+            done = count_frames(path)
+            if os.path.exists(path):
+                os.remove(path)
+            label = f'{racers[name][0] or "bgolly"} {racers[name][1]}'
+            if 1 < done < n_frames:
+                # Supposing the rest of its frames would have come as quickly as the ones so far
+                saved = elapsed * (n_frames - done) / (done - 1)
+                notes.append(f'{label} stopped at frame {done}/{n_frames} (about {round(saved, 2)}s saved)')
+            else:
+                notes.append(f'{label} stopped at frame {done}/{n_frames}')
+        if winner is None:
+            return None, err, ''
+        engine, algo = racers[winner]
+        return winner, '', f'{engine or "bgolly"} {algo} won in {round(elapsed, 2)}s; ' + '; '.join(notes)
+
+    async def run_bgolly_timeline(self, current, algo, gens, rule, writrule):
+        """
+        Same as engines.simulate_timeline, with bgolly: runs it once per frame, each run
+        carrying on from the last, into `current`_frames.rle
+        """
+        deadline = time.monotonic() + 5 * 60
+        for i, (before, after) in enumerate(zip(gens, gens[1:])):
+            if i:
+                await self.loop.run_in_executor(None, write_checkpoint_input, current, writrule)
+            infile = f'{current}_resume.rle' if i else None
+            err = await self.run_bgolly(current, algo, after - before, after - before, rule, infile=infile)
+            if err:
+                return err
+            _, _, (width, height) = await self.loop.run_in_executor(None, last_frame, f'{current}_out.rle', True)
+            if i and width * height > engines.MAX_CELLS:
+                os.remove(f'{current}_out.rle')
+                break
+            await self.loop.run_in_executor(None, merge_frames, current, bool(i))
+            if time.monotonic() > deadline:
+                break
+        return ''
+
+    async def send_timeline(
+            self, ctx, curlog, announcement, details, current, engine, algo, rule, engine_rule, pat, writrule,
+            gens, colors, bg, grid, flags
+    ):
+        """Sends a GIF of the pattern at each generation in `gens`, labelled with its generation, for -exp"""
+        job = self.scheduler.enqueue(
+            ctx.author.id, getattr(ctx.guild, 'id', None), len(gens) * self.pattern_size(current, pat), curlog
+        )
+        queued = await self.announce_queued(ctx, announcement, details, job)
+        try:
+            async with self.scheduler.slot(job):
+                if queued:
+                    await announcement.edit(content=details)
+                start = time.perf_counter()
+                if engine is None:
+                    err = await self.run_bgolly_timeline(current, algo, gens, rule, writrule)
+                else:
+                    err = await self.loop.run_in_executor(
+                        self.ppe, engines.simulate_timeline,
+                        engine, engine_rule, pat, f'{current}_frames.bin', gens
+                    )
+                if err:
+                    curlog.status = Status.FAILED
+                    return await ctx.send(f'`{err}`')
+                bbox, trackmaxes, n_frames, file_colors = await self.loop.run_in_executor(
+                    None, scan_frames,
+                    frames_path(current)
+                )
+                colors.update(file_colors)
+                # Frames are drawn where they are rather than in one big bounding box, which
+                # would be far too big for anything that moves or grows in a billion generations
+                (stride, downscaled, oversized), _, _ = await self.loop.run_in_executor(
+                    self.ppe, makeframes,
+                    current, n_frames - 1, 1, bbox, n_frames, 0, colors, bg, True, trackmaxes, grid,
+                    None, 1, [f'gen {gen}' for gen in gens[:n_frames]], 'density' in flags
+                )
+            curlog.status = Status.COMPLETED
+            notes = (
+                ['every frame not shown'] * (stride > 1) + ['scale lowered'] * downscaled
+                + ['truncated'] * oversized
+            )
+            await ctx.send(
+                f'By {ctx.message.author.mention}'
+                + (f'\n{round(time.perf_counter() - start, 2)}s' if 'time' in flags else '')
+                + (f'\n(Stopped at generation {gens[n_frames - 1]}, past which the pattern was too big or slow)'
+                   if n_frames < len(gens) else '')
+                + (f'\n({", ".join(notes).capitalize()} to fit under 8MB)' if notes else ''),
+                file=discord.File(f'{current}.gif')
+            )
+        except discord.errors.HTTPException:
+            await ctx.send(f'`HTTP 413: GIF too large. Try a bigger -exp ratio!`')
+        except concurrent.futures.process.BrokenProcessPool:
+            curlog.status = Status.FAILED
+            await ctx.send("Error: You almost made me crash... :angry:")
+        except MemoryError:
+            curlog.status = Status.FAILED
+            await ctx.send("Error: You made me run out of memory... :angry:")
+        finally:
+            if os.path.exists(f'{current}.gif'):
+                os.remove(f'{current}.gif')
+            self.discard_input(current)
+            self.discard_checkpoint(current)
+
+    async def send_final(
+            self, ctx, curlog, announcement, details, current, engine, algo, rule, engine_rule, pat, writrule, gen,
+            flags
+    ):
+        """Sends the pattern at generation `gen` as a pattern file, with its population and bounding box, for -final"""
+        hashlife = engine in engines.HASHLIFE_ENGINES or engine is None and algo == 'HashLife'
+        cost = self.pattern_size(current, pat) * (gen.bit_length() if hashlife else gen)
+        job = self.scheduler.enqueue(ctx.author.id, getattr(ctx.guild, 'id', None), cost, curlog)
+        queued = await self.announce_queued(ctx, announcement, details, job)
+        path = None
+        try:
+            async with self.scheduler.slot(job):
+                if queued:
+                    await announcement.edit(content=details)
+                start = time.perf_counter()
+                if engine is None:
+                    # Golly's hashing algos can write macrocell, for when the RLE is too big
+                    macrocell = algo in HASHING_ALGOS
+                    err = await self.run_bgolly(current, algo, gen, gen, rule)
+                    summary = None if err else await self.loop.run_in_executor(
+                        None, save_final,
+                        current, rule, gen, MAX_PATTERN_BYTES, writrule if macrocell else None
+                    )
+                    if macrocell and summary is not None and summary[1] is not None and summary[2] is None:
+                        summary = *summary[:2], await self.save_macrocell(current, algo, rule, writrule)
+                else:
+                    # lifelib can't be stopped partway through a jump, so the process it's in is killed instead
+                    timeout = 5 * 60
+                    try:
+                        result = await asyncio.wait_for(
+                            self.simulate_apart(
+                                engines.simulate_final, engine, engine_rule, pat, f'{current}_final', gen, rule,
+                                MAX_PATTERN_BYTES, timeout
+                            ),
+                            timeout
+                        )
+                    except asyncio.TimeoutError:
+                        result = f'Error: Timed out after {timeout // 60} minutes'
+                    err, summary = (result, None) if isinstance(result, str) else result
+            if err:
+                curlog.status = Status.FAILED
+                return await ctx.send(f'`{err}`')
+            curlog.status = Status.COMPLETED
+            population, bbox, path = summary
+            if bbox is None:
+                content = f'The pattern dies out by generation `{gen}`.'
+            else:
+                x, y, width, height = bbox
+                content = (
+                    f'Generation `{gen}`: population `{population}`,'
+                    f' bounding box `{width}\u00d7{height}` at `({x}, {y})`'
+                    + ('' if path else '\n(Pattern too large to attach)')
+                )
+            await ctx.send(
+                f'By {ctx.message.author.mention}\n{content}'
+                + (f'\n{round(time.perf_counter() - start, 2)}s' if 'time' in flags else ''),
+                file=discord.File(path) if path else None
+            )
+        finally:
+            for leftover in (path, f'{current}_out.rle', f'{current}_big.rle'):
+                if leftover and os.path.exists(leftover):
+                    os.remove(leftover)
+            self.discard_input(current)
+
+    async def save_macrocell(self, current, algo, rule, writrule):
+        """
+        Has bgolly rewrite the generation save_final() left in `current`_big.rle as
+        `current`_final.mc, whose repeated blocks are stored once. Returns its path, or
+        None if bgolly failed or it's still too big to send.
+        """
+        path = f'{current}_final.mc'
+        err = await self.run_bgolly(current, algo, 0, 1, rule, infile=f'{current}_big.rle', outfile=path)
+        os.remove(f'{current}_big.rle')
+        if err or not os.path.exists(path) or os.path.getsize(path) > MAX_PATTERN_BYTES:
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+        if writrule != rule:
+            # A rule table's stored name, which means nothing to anyone else
+            await self.loop.run_in_executor(None, rename_rule, path, rule)
+        return path
+
+    async def send_spacetime(
+            self, ctx, curlog, announcement, details, current, rule, pat, gen, colors, bg, grid, flags
+    ):
+        """Sends a 1D rule's whole run as one spacetime image"""
+        job = self.scheduler.enqueue(ctx.author.id, getattr(ctx.guild, 'id', None), gen * len(pat), curlog)
+        queued = await self.announce_queued(ctx, announcement, details, job)
+        try:
+            async with self.scheduler.slot(job):
+                if queued:
+                    await announcement.edit(content=details)
+                start = time.perf_counter()
+                err = await self.loop.run_in_executor(
+                    self.ppe, render_spacetime,
+                    rule, pat, gen, colors, bg, grid, f'{current}.png'
+                )
+        except concurrent.futures.process.BrokenProcessPool:
+            err = "Error: You almost made me crash... :angry:"
+        except MemoryError:
+            err = "Error: You made me run out of memory... :angry:"
+        if err:
+            self.discard_input(current)
+            curlog.status = Status.FAILED
+            return await ctx.send(f'`{err}`')
+        curlog.status = Status.COMPLETED
+        try:
+            await ctx.send(
+                f'By {ctx.message.author.mention}'
+                + (f'\n{round(time.perf_counter() - start, 2)}s' if 'time' in flags else ''),
+                file=discord.File(f'{current}.png')
+            )
+        except discord.errors.HTTPException:
+            await ctx.send(f'`HTTP 413: Image too large. Try a lower GEN!`')
+        finally:
+            os.remove(f'{current}.png')
+            self.discard_input(current)
+
+    def compile_later(self, rule, algo):
+        """Has lifelib compile `rule` in the background if it can run it, so that later sims can"""
+        if len(self.compiling) >= LIFELIB_COMPILES:
+            return
+        name = algo in engines.lifelib.ALGOS and engines.lifelib.canonical(rule)
+        if not name or name in self.compiling or name in self.uncompilable or engines.lifelib.compiled(name):
+            return
+        self.compiling.add(name)
+
+        def done(future):
+            self.compiling.discard(name)
+            # A failed compile just leaves the rule to bgolly
+            if future.cancelled() or future.exception():
+                self.uncompilable.add(name)
+
+        self.loop.run_in_executor(self.compiler, engines.lifelib.compile_rule, rule).add_done_callback(done)
+
+    @staticmethod
+    def gif_key(pat, rule, rulefile, gen, step, algo, bg, grid, track, density):
+        """Cache key for a GIF, made from everything that goes into simulating and rendering it"""
+        return digest(
+            GIF_CACHE_VERSION, ''.join(pat.split()), rule, rulefile.decode(), gen, step, algo, bg, grid, track, density
+        )
+
+    async def cached_gif(self, key, current):
+        """On a cache hit, writes the cached GIF to `current`.gif and returns what do_gif would have"""
+        if key is None:
+            return None
+        start = time.perf_counter()
+        fit = await self.loop.run_in_executor(None, load_cached_gif, self.gifcache, key, f'{current}.gif')
+        if fit is None:
+            return None
+        return {'coro': ({'cache': time.perf_counter() - start}, fit, None)}
+
+    async def cache_gif(self, key, current, times, fit):
+        if key is not None and 'cache' not in times:
+            await self.loop.run_in_executor(None, store_cached_gif, self.gifcache, key, f'{current}.gif', fit)
+
+    async def announce_queued(self, ctx, announcement, details, job):
+        """
+        If `job` has to wait for a slot, says so in the announcement; returns whether it
+        does. If the announcement can't be edited, the job is withdrawn before the error
+        goes any further, so that it can't end up holding a slot nobody releases.
+        """
+        if job.ready.done():
+            return False
+        position = self.scheduler.queued().index(job)
+        try:
+            await announcement.edit(
+                content=f'{details}\nQueued behind {position + len(self.scheduler.running)} other simulation(s),'
+                        f' starting in about {round(self.scheduler.eta(position))}s. See `{ctx.prefix}sim queue`.'
+            )
+        except BaseException:
+            self.scheduler.withdraw(job)
+            raise
+        return True
 
     def moreinfo(self, ctx):
         return f"'{ctx.prefix}help sim' for more info"
@@ -390,18 +1484,24 @@ class CA(commands.Cog):
         GEN: Generation to simulate up to.
         STEP: Step size. Affects simulation speed. If omitted, defaults to 1.
         RULE: Rulestring to simulate PAT under. If omitted, defaults to B3/S23 or rule specified in PAT.
-        PAT: One-line rle or .lif file to simulate. If omitted, uses last-sent Golly-compatible pattern (which should be enclosed in a code block and therefore can be a multiliner).
+        PAT: One-line rle or .lif file to simulate. If omitted, uses last-sent Golly-compatible pattern (which should be enclosed in a code block and therefore can be a multiliner), or last-attached .rle, .mc or .cells file.
         #TODO: streamline GIF generation process, implement proper LZW compression, implement flags & gfycat upload
 
         <[FLAGS]>
         -ca: Use CAViewer instead of the default bgolly.
-        -h: Use HashLife instead of the default QuickLife.
+        -h: Use HashLife instead of the default QuickLife. Without it, a short probe run decides which suits the pattern.
+        -race: Run QuickLife and HashLife at once and keep whichever finishes first.
+        -exp: Show the pattern at generations 0, 1, 2, 4, 8... up to GEN, using HashLife to jump ahead; GEN can be in the billions.
+          RATIO: Multiply the generation by RATIO from frame to frame instead of 2.
+        -final: Skip the GIF and send the pattern at generation GEN as a file (RLE, or macrocell if that's too big and the algo can write it), with its population and bounding box. GEN can be in the billions.
         -time: Include time taken to create gif (in seconds w/hundredths) alongside GIF.
           all: Provide verbose output, showing time taken for each step alongside the type of executor used.
         -tag: When finished, tag requester. Useful for time-intensive simulations.
         -id: Has no function besides appearing above the final output, but can be used to tell apart simultaneously-created gifs.
         -t: Track. Rudimentary impl, nothing smooth -- goes by generation.
         -g: Show grid lines.
+        -density: When the pattern is too big to show a cell a pixel, shade each pixel by how many of its cells are alive, rather than by whether any are.
+        -scroll: For 1D rules, animate a window scrolling down the generations instead of drawing them all in one image.
         """
         given_rule, display_given_rule = rule, False
         rand = kwargs.get('rand')
@@ -421,6 +1521,7 @@ class CA(commands.Cog):
 
         track = 'track' in flags or 't' in flags
         grid = 'grid' in flags or 'g' in flags
+        density = 'density' in flags
 
         person_to_tag = ""
 
@@ -429,8 +1530,26 @@ class CA(commands.Cog):
         except ValueError:
             return await ctx.send(f"`Error: No GEN given. {self.moreinfo(ctx)}`")
         gen = genconvert(gen)
-        if gen / step > 2500:
+        timeline = None
+        final = 'final' in flags and 'exp' not in flags
+        if 'exp' in flags:
+            try:
+                ratio = 2 if flags['exp'] is True else float(flags['exp'])
+            except ValueError:
+                ratio = 0
+            if not ratio > 1:
+                return await ctx.send(f"`Error: -exp takes a ratio greater than 1, e.g. -exp:10. {self.moreinfo(ctx)}`")
+            if math.log(1 + gen) / math.log(ratio) > 2500:
+                return await ctx.send(f"`Error: Cannot simulate more than 2500 frames. {self.moreinfo(ctx)}`")
+            timeline = timeline_gens(1 + gen, ratio)
+        elif not final and gen / step > 2500:
             return await ctx.send(f"`Error: Cannot simulate more than 2500 frames. {self.moreinfo(ctx)}`")
+        current = f'{self.dir}/{ctx.message.id}'
+        # whether an attached pattern file has been downloaded to `current`_in.rle for bgolly
+        # to read as it is, whether it's macrocell, and whether the in-process engines can
+        # run it (see read_attachment)
+        attached, macrocell, gridded = False, False, True
+        pat_key = None
         if not pat and not rand:
             async for msg in ctx.channel.history(limit=50):
                 rmatch = rXRLE.search(msg.content)
@@ -440,7 +1559,29 @@ class CA(commands.Cog):
                     if rmatch.group(1):
                         rule = rmatch.group(1)
                     break
-            if not pat:
+                attachment = mutils.pattern_attachment(msg)
+                if attachment is not None:
+                    person_to_tag = msg.author
+                    try:
+                        await mutils.download(attachment, f'{current}_in.rle', self.session)
+                    except ValueError as e:
+                        return await ctx.send(f'`Error: {e}`')
+                    except aiohttp.ClientError:
+                        return await ctx.send(f'`Error: Could not download {attachment.filename}`')
+                    file_format, file_rule, pat, gridded = await self.loop.run_in_executor(
+                        None, read_attachment,
+                        f'{current}_in.rle'
+                    )
+                    # Plaintext has been turned into RLE, which is written out like any other
+                    attached, macrocell = file_format != 'cells', file_format == 'mc'
+                    if pat is None:
+                        # Left in the file for bgolly, with its hash standing in for it in the GIF cache's keys
+                        pat = ''
+                        pat_key = await self.loop.run_in_executor(None, file_digest, f'{current}_in.rle')
+                    if file_rule:
+                        rule = file_rule
+                    break
+            if not pat and not attached:
                 return await ctx.send(f"`Error: No PAT given and none found in last 50 messages. {self.moreinfo(ctx)}`")
         elif pat and not rand:
             pat = pat.strip('`')
@@ -457,10 +1598,9 @@ class CA(commands.Cog):
         bg, fg = ((255, 255, 255), (0, 0, 0)) if 'bw' in flags else ((54, 57, 62), (255, 255, 255))
         colors = {'o': fg, 'b': bg}
 
-        current = f'{self.dir}/{ctx.message.id}'
         rule = ''.join(rule.split()) or 'B3/S23'
 
-        n_states = 2
+        n_states, rulefile = 2, b''
         if rLtL.match(rule):
             algo = 'Larger than Life'
             n_states = 2 + int(rLtL.match(rule)[1])
@@ -475,23 +1615,18 @@ class CA(commands.Cog):
 
         if algo == 'RuleLoader':
             try:
-                rulefile = bytes(await mutils.get_rule_from_wiki(rule, self.session), 'utf-8')
+                rulefile, (rulename, n_states, colors) = await self.rulecache.get(rule, self.session)
             except FileNotFoundError:  # rule not found
+                self.discard_input(current)
                 return await ctx.send('`Error: Rule not found`')
-
-            rulename, n_states, colors = await self.loop.run_in_executor(
-                None,
-                mutils.extract_rule_info,
-                rulefile
-            )
             if not n_states:
+                self.discard_input(current)
                 return await ctx.send('Error: n_states not found in rule fetched from wiki')
             if not rulename:
+                self.discard_input(current)
                 return await ctx.send('Error: rulename not found in rule fetched from wiki')
 
             bg, colors = mutils.colorpatch(json.loads(colors), n_states, fg, bg)
-            with open(f'{self.dir}/{rulename}_{ctx.message.id}.rule', 'wb') as ruleout:
-                ruleout.write(rulefile)
         if algo == 'Larger than Life':
             n_states = int(rule.split('C')[1].split(',')[0])
             if n_states > 2:
@@ -510,11 +1645,60 @@ class CA(commands.Cog):
                 with open(f"{self.dir}/Temporary.rule", "w+") as f:
                     f.write(rule_content)
                 rule = "Temporary"
+        if macrocell:
+            algo = 'HashLife' if algo == 'QuickLife' else algo
+            if algo not in HASHING_ALGOS:
+                self.discard_input(current)
+                return await ctx.send(f"`Error: Macrocell needs HashLife, which {algo} can't stand in for.`")
+            if algo == 'HashLife':
+                await self.loop.run_in_executor(None, leaf_macrocell, f'{current}_in.rle')
+
+        # Rule tables are run from the rule file itself rather than by name
+        engine_rule = rulefile.decode() if algo == 'RuleLoader' else rule
+        # Engines that work out every cell of the bounding box are only worth it for big
+        # patterns (see engines.DENSE_ENGINES), and for soups too big for bgolly regardless;
+        # about half a soup's cells are alive
+        population = None
+        if rand and max(dims) <= MAX_SOUP:
+            population = dims[0] * dims[1] // 2
+        elif not rand and gridded:
+            population = await self.loop.run_in_executor(None, pattern_population, pat)
+        engine = engines.find_engine(engine_rule, algo, population=population, step=step) if gridded else None
+        racers = prober = None
+        if gridded and algo in ('QuickLife', 'HashLife') and engine != 'oned' and '::' not in rule:
+            # Each of QuickLife and HashLife beats the other on some patterns, so sim can pick
+            # between them (see below); each is (engine, algo), in-process where an engine can be
+            racers = {
+                side: (engines.find_engine(rule, side, side == 'HashLife', population, step), side)
+                for side in ('QuickLife', 'HashLife')
+            }
+            engine = racers[algo][0]
+            # The probe needs an engine that works out every generation, however quick bgolly would be
+            prober = engines.find_engine(rule, 'QuickLife', hashlife=False)
+        race = racers is not None and 'race' in flags and timeline is None and not final
+        # Which of QuickLife and HashLife to use is left to a probe run once the sim has a slot
+        probing = racers is not None and not race and timeline is None and not final and 'h' not in flags
+        probing = probing and prober is not None
+        if engine != 'lifelib':
+            self.compile_later(rule, algo)
+        if engine == 'ltl' and algo == 'CAViewer':
+            # HROT, whose colors would otherwise have come with CAViewer's output
+            n_states = engines.ltl.parse_rule(rule)[1]
+            if n_states > 2:
+                colors = mutils.ColorRange(n_states, (255, 255, 0), (255, 0, 0)).to_dict()
+        elif engine == 'oned':
+            n_states = engines.oned.parse_rule(rule)[2]
+            if n_states > 2:
+                colors = mutils.ColorRange(n_states).to_dict()
 
         if rand:
+            limit = MAX_BITBOARD_SOUP if engine == 'bitboard' else MAX_SOUP
+            if max(dims) > limit:
+                return await ctx.send(
+                    f'`Error: Cannot simulate soup with dimension greater than {limit} in this rule. {self.moreinfo(ctx)}`')
             rule_ = rule.split('::')[0]
             if algo == 'RuleLoader':
-                rule_ += f'_{ctx.message.id}'
+                rule_ = self.rulestore.name(rule_, rulefile)
             include, exclude = kwargs['soup_include_states'], kwargs['soup_exclude_states']
             allowed_states = include if include else set(range(n_states))
             if exclude:
@@ -527,164 +1711,247 @@ class CA(commands.Cog):
             )
             dims = f'{dims[0]}\u00d7{dims[1]}'
 
+        choice = None
+        if timeline is not None:
+            # Only HashLife (or Golly's other hashing algos) gets that far quickly
+            algo = 'HashLife' if algo == 'QuickLife' else algo
+            if algo not in HASHING_ALGOS:
+                self.discard_input(current)
+                return await ctx.send(f"`Error: -exp needs HashLife, which {algo} can't stand in for. {self.moreinfo(ctx)}`")
+            engine = engines.find_engine(engine_rule, algo, hashlife=True) if gridded else None
+        if final:
+            # As for -exp, only HashLife and the like get far quickly; an engine that works out
+            # every generation would step through them all (and the oned engine only keeps the
+            # latest rows, where Golly's last generation is the whole diagram)
+            algo = 'HashLife' if algo == 'QuickLife' else algo
+            engine = engines.find_engine(engine_rule, algo, hashlife=True) if gridded else None
+
         details = (
                 (f'Running `{dims}` soup' if rand else f'Running supplied pattern')
-                + f' in rule `{given_rule if display_given_rule else rule}` with '
-                + f'step `{step}` for `{1 + gen}` generation(s)'
-                + (f' using `{algo}`.' if algo != 'QuickLife' else '.')
+                + f' in rule `{given_rule if display_given_rule else rule}` '
+                + (
+                    f'to generation `{timeline[-1]}` in `{len(timeline) - 1}` exponential steps'
+                    if timeline else f'to generation `{1 + gen}`' if final
+                    else f'with step `{step}` for `{1 + gen}` generation(s)'
+                )
+                + (' racing `QuickLife` and `HashLife`.' if race else f' using `{algo}`.' if algo != 'QuickLife' else '.')
         )
         announcement = await ctx.send(details)
         curlog = Log(ctx.author.mention, rule, ctx.message.created_at.replace(tzinfo=dt.timezone.utc), Status.WAITING)
         self.simlog.append(curlog)
-        writrule = f'{rule}_{ctx.message.id}' if algo == 'RuleLoader' else rule
-        with open(f'{current}_in.rle', 'w') as infile:
-            infile.write(pat if pat.startswith('x = ') else f'x = 0, y = 0, rule = {writrule}\n{pat}')
-        bg_err = await self.run_bgolly(current, algo, gen, step, rule)
-        if bg_err:
-            curlog.status = Status.FAILED
-            return await ctx.send(f'```{bg_err}```')
-        await announcement.add_reaction('\N{WASTEBASKET}')
-        curlog.status = Status.SIMMING
-
-        try:
-            resp = await mutils.await_event_or_coro(
-                self.bot,
-                event='reaction_add',
-                coro=self.do_gif(execs, current, gen, step, colors, track, bg, grid),
-                ret_check=lambda obj: isinstance(obj, discord.Message),
-                event_check=lambda rxn, usr: self.cancellation_check(ctx, announcement, rxn, usr)
+        if engine == 'oned' and 'scroll' not in flags:
+            return await self.send_spacetime(
+                ctx, curlog, announcement, details, current, rule, pat, gen, colors, bg, grid, flags
             )
-        except FileNotFoundError:
-            curlog.status = Status.FAILED
-            return await ctx.send(f'Error: Timed out')
-        except concurrent.futures.process.BrokenProcessPool:
-            curlog.status = Status.FAILED
-            return await ctx.send("Error: You almost made me crash... :angry:")
-        except MemoryError:
-            curlog.status = Status.FAILED
-            return await ctx.send("Error: You made me run out of memory... :angry:")
-        except Exception as e:
-            curlog.status = Status.FAILED
-            # return await ctx.send(f"Error: `{str(e)}`")
-            raise e
+        writrule = self.rulestore.acquire(rule, rulefile) if algo == 'RuleLoader' else rule
         try:
-            start, end_parse, end_makeframes, oversized = resp['coro']
-        except (KeyError, ValueError):
-            curlog.status = Status.CANCELED
-            return await resp['event'][0].message.delete()
-        content = (
-                (ctx.message.author.mention if 'tag' in flags else '')
-                + (f' **{discord.utils.escape_mentions(flags["id"])}** \n' if 'id' in flags else '')
-                + '{time}'
-        )
-        curlog.status = Status.COMPLETED
-
-        try:
-            gif = await ctx.send(
-                content.format(
-                    time=str(
-                        {
-                            'Times': '',
-                            '**Parsing frames**': f'{round(end_parse - start, 2)}s ({execs[0][1]})',
-                            '**Saving frames to GIF**': f'{round(end_makeframes - end_parse, 2)}s ({execs[1][1]})',
-                            '(**Total**': f'{round(end_makeframes - start, 2)}s)'
-                        }
-                    ).replace("'", '').replace(',', '\n').replace('{', '\n').replace('}', '\n')
-                    if flags.get('time') == 'all'
-                    else f'{round(end_makeframes - start, 2)}s'
-                    if 'time' in flags
-                    else ''
-                ) + ('\n(Truncated to fit under 8MB)' if oversized else ''),
-                file=discord.File(f'{current}.gif')
+            if attached:
+                if algo == 'RuleLoader':
+                    # so that bgolly finds the stored rule file
+                    await self.loop.run_in_executor(None, rename_rule, f'{current}_in.rle', writrule)
+            elif engine is None or race or probing:
+                # which bgolly needs, and the probe might yet pick bgolly
+                with open(f'{current}_in.rle', 'w') as infile:
+                    infile.write(pat if pat.startswith('x = ') else f'x = 0, y = 0, rule = {writrule}\n{pat}')
+            if final:
+                return await self.send_final(
+                    ctx, curlog, announcement, details, current, engine, algo, rule, engine_rule, pat, writrule,
+                    1 + gen, flags
+                )
+            if timeline is not None:
+                return await self.send_timeline(
+                    ctx, curlog, announcement, details, current, engine, algo, rule, engine_rule, pat, writrule,
+                    timeline, colors, bg, grid, flags
+                )
+            # Rough measure of the work involved, for the scheduler to favor small jobs
+            guild, cost = getattr(ctx.guild, 'id', None), (1 + gen) * self.pattern_size(current, pat)
+            key = None if rand else self.gif_key(
+                pat_key or pat, rule, rulefile, gen, step, algo, bg, grid, track, density
             )
-            newline = '\n' * bool(gif.content)
-            if 'tag' not in flags:
-                if person_to_tag != "":
-                    await gif.edit(content=f'By {person_to_tag.mention}{newline}{gif.content}')
-                else:
-                    await gif.edit(content=f'By {ctx.message.author.mention}{newline}{gif.content}')
-        except discord.errors.HTTPException as e:
-            curlog.status = Status.FAILED
-            return await ctx.send(
-                f'{ctx.message.author.mention}\n`HTTP 413: GIF too large. Try a higher STEP or lower GEN!`')
-
-        def extension_or_deletion_check(rxn, usr):
-            if usr == ctx.message.author or usr.id == WRIGHT:
-                if rxn.emoji in '➕⏩' and rxn.message.id == gif.id:
-                    return True
-                return rxn.emoji == '\N{WASTEBASKET}' and rxn.message.id == announcement.id
+            resp = await self.cached_gif(key, current)
+            if resp is not None:
+                await announcement.add_reaction('\N{WASTEBASKET}')
+            else:
+                job = self.scheduler.enqueue(ctx.author.id, guild, cost, curlog)
+                queued = await self.announce_queued(ctx, announcement, details, job)
+                async with self.scheduler.slot(job):
+                    if queued:
+                        await announcement.edit(content=details)
+                    if probing:
+                        engine, algo, choice = await self.probe(racers, prober, rule, pat, gen)
+                        if algo != 'QuickLife':
+                            details = details.removesuffix('.') + f' using `{algo}`.'
+                            await announcement.edit(content=details)
+                    if race:
+                        winner, bg_err, choice = await self.race(current, racers, gen, step, rule, pat)
+                        if winner is not None:
+                            engine, algo = racers[winner]
+                    else:
+                        bg_err = await self.simulate(current, engine, algo, gen, step, engine_rule, pat, writrule)
+                    if bg_err:
+                        curlog.status = Status.FAILED
+                        return await ctx.send(f'```{bg_err}```')
+                    await announcement.add_reaction('\N{WASTEBASKET}')
+
+                    try:
+                        resp = await mutils.await_event_or_coro(
+                            self.bot,
+                            event='reaction_add',
+                            coro=self.do_gif(
+                                execs, current, gen, step, colors, track, bg, grid, merge=engine is None, density=density
+                            ),
+                            ret_check=lambda obj: isinstance(obj, discord.Message),
+                            event_check=lambda rxn, usr: self.cancellation_check(ctx, announcement, rxn, usr)
+                        )
+                    except FileNotFoundError:
+                        curlog.status = Status.FAILED
+                        return await ctx.send(f'Error: Timed out')
+                    except concurrent.futures.process.BrokenProcessPool:
+                        curlog.status = Status.FAILED
+                        return await ctx.send("Error: You almost made me crash... :angry:")
+                    except MemoryError:
+                        curlog.status = Status.FAILED
+                        return await ctx.send("Error: You made me run out of memory... :angry:")
+                    except Exception as e:
+                        curlog.status = Status.FAILED
+                        # return await ctx.send(f"Error: `{str(e)}`")
+                        raise e
+            try:
+                times, (stride, downscaled, oversized), checkpoint = resp['coro']
+            except (KeyError, ValueError):
+                curlog.status = Status.CANCELED
+                self.discard_checkpoint(current)
+                return await resp['event'][0].message.delete()
+            if choice is not None:
+                times['choice'] = choice
+            await self.cache_gif(key, current, times, (stride, downscaled, oversized))
+            content = (
+                    (ctx.message.author.mention if 'tag' in flags else '')
+                    + (f' **{discord.utils.escape_mentions(flags["id"])}** \n' if 'id' in flags else '')
+                    + '{time}'
+            )
+            curlog.status = Status.COMPLETED
 
-        try:
-            while True:
-                if gen < 2500 * step and not oversized:
-                    await gif.add_reaction('➕')
-                await gif.add_reaction('⏩')
-                rxn, _ = await self.bot.wait_for('reaction_add', timeout=25.0, check=extension_or_deletion_check)
-                await gif.delete()
-                if rxn.emoji == '\N{WASTEBASKET}':
-                    await announcement.delete()
-                    break
-                if rxn.emoji == '➕':
-                    gen = self._extend(gen)
-                else:
-                    step *= 2
-                    oversized = False
-                details = (
-                        (f'Running `{dims}` soup' if rand else f'Running supplied pattern')
-                        + f' in rule `{rule}` with step `{step}` for `{gen + bool(rand)}` generation(s)'
-                        + (f' using `{algo}`.' if algo != 'QuickLife' else '.')
-                )
-                await announcement.edit(content=details)
-                bg_err = await self.run_bgolly(current, algo, gen, step, rule)
-                if bg_err:
-                    return await ctx.send(f'`{bg_err}`')
-                resp = await mutils.await_event_or_coro(
-                    self.bot,
-                    event='reaction_add',
-                    coro=self.do_gif(execs, current, gen, step, colors, track, bg, grid),
-                    ret_check=lambda obj: isinstance(obj, discord.Message),
-                    event_check=lambda rxn, usr: self.cancellation_check(ctx, announcement, rxn, usr)
+            try:
+                gif = await ctx.send(
+                    content.format(
+                        time=self.format_times(flags, execs, times)
+                    ) + self.fit_note(step, stride, downscaled, oversized),
+                    file=discord.File(f'{current}.gif')
                 )
-                try:
-                    start, end_parse, end_makeframes, oversized = resp['coro']
-                except KeyError:
-                    return await resp['event'][0].message.delete()
-                try:
-                    gif = await ctx.send(
-                        content.format(
-                            time=str(
-                                {
-                                    'Times': '',
-                                    '**Parsing frames**': f'{round(end_parse - start, 2)}s ({execs[0][1]})',
-                                    '**Saving frames to GIF**': f'{round(end_makeframes - end_parse, 2)}s ({execs[1][1]})',
-                                    '(**Total**': f'{round(end_makeframes - start, 2)}s)'
-                                }
-                            ).replace("'", '').replace(',', '\n').replace('{', '\n').replace('}', '\n')
-                            if flags.get('time') == 'all'
-                            else f'{round(end_makeframes - start, 2)}s'
-                            if 'time' in flags
-                            else ''
-                        ) + ('\n(Truncated to fit under 8MB)' if oversized else ''),
-                        file=discord.File(f'{current}.gif')
+                newline = '\n' * bool(gif.content)
+                if 'tag' not in flags:
+                    if person_to_tag != "":
+                        await gif.edit(content=f'By {person_to_tag.mention}{newline}{gif.content}')
+                    else:
+                        await gif.edit(content=f'By {ctx.message.author.mention}{newline}{gif.content}')
+            except discord.errors.HTTPException as e:
+                curlog.status = Status.FAILED
+                self.discard_checkpoint(current)
+                return await ctx.send(
+                    f'{ctx.message.author.mention}\n`HTTP 413: GIF too large. Try a higher STEP or lower GEN!`')
+
+            def extension_or_deletion_check(rxn, usr):
+                if usr == ctx.message.author or usr.id == WRIGHT:
+                    if rxn.emoji in '➕⏩' and rxn.message.id == gif.id:
+                        return True
+                    return rxn.emoji == '\N{WASTEBASKET}' and rxn.message.id == announcement.id
+
+            try:
+                while True:
+                    # Extend from the step the last GIF was actually rendered at
+                    step, stride = step * stride, 1
+                    if gen < 2500 * step and not oversized:
+                        await gif.add_reaction('➕')
+                    await gif.add_reaction('⏩')
+                    rxn, _ = await self.bot.wait_for('reaction_add', timeout=25.0, check=extension_or_deletion_check)
+                    await gif.delete()
+                    if rxn.emoji == '\N{WASTEBASKET}':
+                        await announcement.delete()
+                        break
+                    # Frames simmed last time can be reused if they were simmed at a step that divides the new one
+                    sim_step, resume, simulated = step, None, True
+                    if rxn.emoji == '➕':
+                        gen = self._extend(gen)
+                        if checkpoint is not None and (engine or algo != 'CAViewer') and not step % checkpoint['step']:
+                            # Carry on from the last frame simmed rather than starting over
+                            last_gen = -(-checkpoint['gen'] // checkpoint['step']) * checkpoint['step']
+                            if gen > last_gen:
+                                resume, sim_step = checkpoint, checkpoint['step']
+                    else:
+                        step *= 2
+                        oversized = False
+                        if checkpoint is not None and not step % checkpoint['step']:
+                            # Every frame needed has been simmed already, so just render fewer of them
+                            sim_step, simulated = checkpoint['step'], False
+                    details = (
+                            (f'Running `{dims}` soup' if rand else f'Running supplied pattern')
+                            + f' in rule `{rule}` with step `{step}` for `{gen + bool(rand)}` generation(s)'
+                            + (f' using `{algo}`.' if algo != 'QuickLife' else '.')
+                    )
+                    await announcement.edit(content=details)
+                    key = None if rand else self.gif_key(
+                        pat_key or pat, rule, rulefile, gen, step, algo, bg, grid, track, density
                     )
-                    if 'tag' not in flags:
-                        if person_to_tag != "":
-                            await gif.edit(content=f'By {person_to_tag.mention}{newline}{gif.content}')
-                        else:
-                            await gif.edit(content=f'By {ctx.message.author.mention}{newline}{gif.content}')
-                except discord.errors.HTTPException as e:
-                    return await ctx.send(f'`HTTP 413: GIF too large. Try a higher STEP or lower GEN!`')
-        except asyncio.TimeoutError:
-            # trigger the finally block
-            pass
+                    resp = await self.cached_gif(key, current)
+                    if resp is None:
+                        job = self.scheduler.enqueue(ctx.author.id, guild, (1 + gen) * self.pattern_size(current, pat))
+                        queued = await self.announce_queued(ctx, announcement, details, job)
+                        async with self.scheduler.slot(job):
+                            if queued:
+                                await announcement.edit(content=details)
+                            if not simulated:
+                                bg_err = ''
+                            elif resume is None:
+                                bg_err = await self.simulate(current, engine, algo, gen, step, engine_rule, pat, writrule)
+                            else:
+                                bg_err = await self.simulate(
+                                    current, engine, algo, gen - last_gen, sim_step, engine_rule, pat, writrule, resume=True
+                                )
+                            if bg_err:
+                                return await ctx.send(f'`{bg_err}`')
+                            resp = await mutils.await_event_or_coro(
+                                self.bot,
+                                event='reaction_add',
+                                coro=self.do_gif(
+                                    execs, current, gen, sim_step, colors, track, bg, grid,
+                                    resume, step // sim_step, simulated and engine is None, density
+                                ),
+                                ret_check=lambda obj: isinstance(obj, discord.Message),
+                                event_check=lambda rxn, usr: self.cancellation_check(ctx, announcement, rxn, usr)
+                            )
+                    try:
+                        times, (stride, downscaled, oversized), checkpoint = resp['coro']
+                    except KeyError:
+                        return await resp['event'][0].message.delete()
+                    await self.cache_gif(key, current, times, (stride, downscaled, oversized))
+                    try:
+                        gif = await ctx.send(
+                            content.format(
+                                time=self.format_times(flags, execs, times)
+                            ) + self.fit_note(step, stride, downscaled, oversized),
+                            file=discord.File(f'{current}.gif')
+                        )
+                        if 'tag' not in flags:
+                            if person_to_tag != "":
+                                await gif.edit(content=f'By {person_to_tag.mention}{newline}{gif.content}')
+                            else:
+                                await gif.edit(content=f'By {ctx.message.author.mention}{newline}{gif.content}')
+                    except discord.errors.HTTPException as e:
+                        return await ctx.send(f'`HTTP 413: GIF too large. Try a higher STEP or lower GEN!`')
+            except asyncio.TimeoutError:
+                # trigger the finally block
+                pass
+            finally:
+                gif = await ctx.channel.fetch_message(gif.id)  # refresh reactions
+                await announcement.remove_reaction('\N{WASTEBASKET}', ctx.guild.me)
+                [await gif.remove_reaction(rxn, ctx.guild.me) for rxn in gif.reactions]
+                os.remove(f'{current}.gif')
+                self.discard_input(current)
+                self.discard_checkpoint(current)
         finally:
-            gif = await ctx.channel.fetch_message(gif.id)  # refresh reactions
-            await announcement.remove_reaction('\N{WASTEBASKET}', ctx.guild.me)
-            [await gif.remove_reaction(rxn, ctx.guild.me) for rxn in gif.reactions]
-            os.remove(f'{current}.gif')
-            os.remove(f'{current}_in.rle')
             if algo == 'RuleLoader':
-                os.remove(f'{self.dir}/{rule}_{ctx.message.id}.rule')
+                self.rulestore.release(writrule)
 
     @sim.error
     async def sim_error(self, ctx, error):
@@ -739,9 +2006,6 @@ class CA(commands.Cog):
                     rule = rmatch.group()
                     break
         x, y = map(int, dims.split('x'))
-        if x > 1500 or y > 1500:
-            return await ctx.send(
-                f'`Error: Cannot simulate soup with dimension greater than 1500. {self.moreinfo(ctx)}`')
         include, exclude = set(), set()
         if 'include' in flags:
             include = mutils.flatten_range_list(flags.pop('include').split(','))
@@ -772,6 +2036,24 @@ class CA(commands.Cog):
             )
         await ctx.send(embed=discord.Embed(title='Last 5 sims', description='\n'.join(entries)))
 
+    @sim.command('Shows running and queued sims')
+    async def queue(self, ctx):
+        scheduler = self.scheduler
+        queued = scheduler.queued()
+        now = time.monotonic()
+        entries = [
+            f'• Running: <@{job.user}> for {round(now - job.started_at)}s'
+            for job in scheduler.running
+        ] + [
+            f'• #{position + 1}: <@{job.user}>, starting in about {round(scheduler.eta(position))}s'
+            + (' (you)' if job.user == ctx.author.id else '')
+            for position, job in enumerate(queued)
+        ]
+        await ctx.send(embed=discord.Embed(
+            title=f'{len(scheduler.running)}/{scheduler.slots} sims running, {len(queued)} queued',
+            description='\n'.join(entries[:20]) or 'Nothing running.'
+        ))
+
     @mutils.command('Generates a *.rule file with CAViewer')
     async def generate_apgtable(self, ctx, rule, name):
         """
@@ -783,14 +2065,12 @@ class CA(commands.Cog):
 
         preface = f'{self.dir}/resources/bin/CAViewer'
 
-        p = subprocess.Popen(
-            f"{preface} apgtable -r {rule} -o {self.dir}/resources/{name}.rule".split(),
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        _, _, err = await mutils.run_process(
+            preface, 'apgtable', '-r', rule, '-o', f'{self.dir}/resources/{name}.rule', timeout=60
         )
-        out = p.communicate()
 
         # An error occured
-        if out[1].decode("utf-8"): return await ctx.send(f'`{out[1].decode("utf-8")}`')
+        if err: return await ctx.send(f'`{err}`')
 
         with open(f"{self.dir}/resources/{name}.rule") as f:
             return await ctx.send(file=discord.File(f, name + '.rule'))
@@ -805,14 +2085,11 @@ class CA(commands.Cog):
 
         preface = f'{self.dir}/resources/bin/CAViewer'
 
-        p = subprocess.Popen(f"{preface} info -r {rule}".split(),
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        out = p.communicate()
+        # as much as an embed's description holds
+        _, desc, err = await mutils.run_process(preface, 'info', '-r', rule, timeout=60, limit=4096)
 
         # An error occured
-        if out[1].decode("utf-8"): return await ctx.send(f'`{out[1].decode("utf-8")}`')
-
-        desc = out[0].decode("utf-8")
+        if err: return await ctx.send(f'`{err}`')
 
         # Bold the key text
         for text in re.findall("[\S ]+:", desc):
@@ -1,5 +1,6 @@
 import os
 import re
+import aiohttp
 import discord
 import subprocess
 import urllib.request
@@ -8,6 +9,7 @@ import urllib.error
 from discord.ext import commands
 
 from cogs.resources import mutils
+from cogs.resources.rle import encode_rle, parse_plaintext
 
 WRIGHT = 180809886374952960
 
@@ -60,6 +62,7 @@ class DB(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.dir = os.path.dirname(os.path.abspath(__file__))
+        self.session = aiohttp.ClientSession()
 
     @mutils.command('Query the 5S database')
     async def sssss(self, ctx, velocity):
@@ -258,20 +261,39 @@ class DB(commands.Cog):
     async def entry(self, ctx):
         """
         # Generates an entry for the GliderDB database #
+        Uses the last-sent pattern, or the last-attached .rle or .cells file.
         """
 
-        pat = ""
+        pat, attachment = "", None
         async for msg in ctx.channel.history(limit=50):
             rmatch = rXRLE.search(msg.content)
             if rmatch:
                 pat = rmatch.group()
                 break
-        if not pat:
+            attachment = mutils.pattern_attachment(msg)
+            if attachment is not None:
+                break
+        if not pat and attachment is None:
             return await ctx.send(f"`Error: No PAT found in last 50 messages.`")
 
         current = f'{self.dir}/{ctx.message.id}'
-        with open(f'{current}_in.rle', 'w') as infile:
-            infile.write(pat)
+        if attachment is None:
+            with open(f'{current}_in.rle', 'w') as infile:
+                infile.write(pat)
+        else:
+            try:
+                await mutils.download(attachment, f'{current}_in.rle', self.session)
+            except ValueError as e:
+                return await ctx.send(f"`Error: {e}`")
+            except aiohttp.ClientError:
+                return await ctx.send(f"`Error: Could not download {attachment.filename}`")
+            file_format, _, _ = await self.bot.loop.run_in_executor(None, mutils.pattern_header, f'{current}_in.rle')
+            if file_format == 'mc':
+                os.remove(f'{current}_in.rle')
+                return await ctx.send(f"`Error: CAViewer can't read macrocell. Attach an .rle file instead.`")
+            if file_format == 'cells':
+                # CAViewer only reads RLE, and plaintext doesn't say what rule it's in
+                await self.bot.loop.run_in_executor(None, self.cells_to_rle, f'{current}_in.rle')
 
         try:
             resp = await mutils.await_event_or_coro(
@@ -283,6 +305,8 @@ class DB(commands.Cog):
             return await ctx.send(f"Error: Ran out of memory :frowning:")
         except Exception as e:
             return await ctx.send(f"Error: `{str(e)}`")
+        finally:
+            os.remove(f'{current}_in.rle')
 
         out = resp["event"]
         if out[1].decode("utf-8"):
@@ -290,6 +314,15 @@ class DB(commands.Cog):
 
         return await ctx.send("```" + out[0].decode("utf-8") + "```")
 
+    @staticmethod
+    def cells_to_rle(path):
+        """Rewrites the plaintext pattern at `path` as RLE in B3/S23"""
+        with open(path, errors='replace') as f:
+            cells, _ = parse_plaintext(f.read())
+        height, width = cells.shape
+        with open(path, 'w') as f:
+            f.write(f"x = {width}, y = {height}, rule = B3/S23\n{encode_rle(cells)}\n")
+
     async def gen_entry(self, file):
         preface = f'{self.dir}/resources/bin/CAViewer'
         p = subprocess.Popen(
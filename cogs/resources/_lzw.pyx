@@ -0,0 +1,77 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Compiled GIF LZW kernel; see gif.lzw_encode for the pure-Python reference.
+Both produce byte-for-byte identical output.
+"""
+from libc.stdlib cimport malloc, free
+from libc.string cimport memset
+
+cdef enum:
+    MAX_CODES = 4096
+
+
+cdef struct BitWriter:
+    unsigned char *buf
+    Py_ssize_t pos
+    unsigned long long acc
+    int nbits
+
+
+cdef inline void emit(BitWriter *w, int code, int size) noexcept nogil:
+    w.acc |= (<unsigned long long>code) << w.nbits
+    w.nbits += size
+    while w.nbits >= 8:
+        w.buf[w.pos] = w.acc & 255
+        w.pos += 1
+        w.acc >>= 8
+        w.nbits -= 8
+
+
+def lzw_encode(const unsigned char[::1] data, int min_code_size):
+    cdef int clear = 1 << min_code_size
+    cdef int eoi = clear + 1
+    cdef int next_code = eoi + 1
+    cdef int code_size = min_code_size + 1
+    cdef Py_ssize_t n = data.shape[0], i, table_bytes = MAX_CODES * clear * sizeof(short)
+    cdef int cur, c, nxt
+    # Dense trie: trie[code * clear + pixel] is the code for (code's string + pixel), or -1
+    cdef short *trie = <short *>malloc(table_bytes)
+    cdef BitWriter w
+    # At most one 12-bit code per pixel, plus clear codes and the final two
+    w.buf = <unsigned char *>malloc(2 * n + 64)
+    w.pos, w.acc, w.nbits = 0, 0, 0
+    if trie is NULL or w.buf is NULL:
+        free(trie)
+        free(w.buf)
+        raise MemoryError
+    try:
+        with nogil:
+            memset(trie, 0xFF, table_bytes)
+            emit(&w, clear, code_size)
+            if n:
+                cur = data[0]
+                for i in range(1, n):
+                    c = data[i]
+                    nxt = trie[cur * clear + c]
+                    if nxt >= 0:
+                        cur = nxt
+                        continue
+                    emit(&w, cur, code_size)
+                    if next_code < MAX_CODES:
+                        if next_code == 1 << code_size:
+                            code_size += 1
+                        trie[cur * clear + c] = next_code
+                        next_code += 1
+                    else:
+                        emit(&w, clear, code_size)
+                        memset(trie, 0xFF, table_bytes)
+                        next_code, code_size = eoi + 1, min_code_size + 1
+                    cur = c
+                emit(&w, cur, code_size)
+            emit(&w, eoi, code_size)
+            if w.nbits:
+                emit(&w, 0, 8 - w.nbits)
+        return w.buf[:w.pos]
+    finally:
+        free(trie)
+        free(w.buf)
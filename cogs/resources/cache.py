@@ -0,0 +1,78 @@
+"""
+Size-bounded LRU cache of byte strings on disk.
+
+Each entry is one file in the cache's directory, named after its key. Recency
+is kept in the files' mtimes as well as in memory, so the eviction order
+survives restarts. Methods are thread-safe, so they can be run in an executor.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def digest(*parts):
+    """Stable hex key for a sequence of JSON-serializable parts"""
+    return hashlib.sha256(json.dumps(parts, separators=(',', ':')).encode()).hexdigest()
+
+
+class DiskCache:
+    def __init__(self, directory, max_bytes):
+        os.makedirs(directory, exist_ok=True)
+        self.dir = directory
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        # key -> size in bytes, least recently used first
+        self.entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self.size = sum(self.entries.values())
+        with self._lock:
+            self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.dir, key)
+
+    def _evict(self):
+        while self.size > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def get(self, key):
+        """Returns the bytes stored under `key`, or None"""
+        with self._lock:
+            if key in self.entries:
+                try:
+                    with open(self._path(key), 'rb') as f:
+                        data = f.read()
+                    os.utime(self._path(key))
+                except FileNotFoundError:  # removed from under us
+                    self.size -= self.entries.pop(key)
+                else:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return data
+            self.misses += 1
+            return None
+
+    def put(self, key, data):
+        """Stores `data` under `key`, evicting old entries to make room"""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            tmp = self._path(f'.{key}.tmp')
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+            self.size += len(data) - self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self._evict()
@@ -24,6 +24,7 @@ aliases = {
   'rules': ['rule'],
   'sim': ['gif'],
   'sim rand': ['r', 'random'],
+  'sim queue': ['q'],
   'generators': ['gens', 'generator', 'gen'],
   'generate_apgtable': ['apgtable'],
   'sssss': ['5s'],
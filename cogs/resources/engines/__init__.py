@@ -0,0 +1,236 @@
+"""
+In-process simulators, which `sim` uses in place of running bgolly or
+CAViewer whenever one of them supports the rule.
+
+Each engine is a module of this package with:
+  supports(rule, algo): whether it can simulate `rule`, which sim would otherwise
+    have run with `algo`
+  evolve(rule, cells, x, y, gen, step): given a state grid whose top-left cell is
+    at (x, y), yields (cells, x, y) for generation 0 and every `step`th one after,
+    up to the first at or past `gen`, each grid cropped to its live cells; an engine
+    that doesn't hold the pattern as a grid raises MemoryError rather than make one
+    of more than MAX_CELLS cells
+and may have:
+  save(rule, cells, x, y, gen, path, max_bytes): writes generation `gen` to a
+    file without holding it as a grid, for simulate_final() (see lifelib.save)
+
+simulate() runs an engine in a worker process, writing its frames to a frame
+store (see framestore.py) for the renderer to read back, and simulate_timeline()
+writes chosen generations instead of evenly spaced ones. simulate_final() writes
+just the last generation, as a pattern file rather than a frame. probe() guesses whether
+a pattern would be quicker to run like QuickLife or like HashLife.
+"""
+import os
+import time
+
+import numpy as np
+
+from cogs.resources import framestore
+from cogs.resources.engines import bitboard, lifelib, ltl, lut, oned, ruletable
+from cogs.resources.engines.bounds import MAX_CELLS
+from cogs.resources.rle import encode_rle, parse_pattern
+
+# name -> engine, in order of preference
+ENGINES = {
+    'bitboard': bitboard,
+    'lifelib': lifelib,
+    'lut': lut,
+    'ltl': ltl,
+    'oned': oned,
+    'ruletable': ruletable,
+}
+
+# engines that memoize a pattern's evolution like HashLife, rather than working out every generation
+HASHLIFE_ENGINES = {'lifelib'}
+
+# engines that work out every cell of the bounding box every generation -> for each algo
+# they're worth standing in for, the smallest population and the largest step at which
+# they are. bgolly spends most of its time writing out frames, so these only beat it on
+# big, dense patterns simmed a frame every generation or few (see bench.engines), or, for
+# rule tables, which bgolly looks up a cell at a time, every few dozen
+DENSE_ENGINES = {
+    'bitboard': {'QuickLife': (1 << 15, 4)},
+    'lut': {'Generations': (1 << 17, 2)},
+    'ruletable': {'RuleLoader': (1 << 12, 64)},
+}
+
+# generations simulate_final() runs between checks on the time and the pattern's size
+FINAL_CHUNK = 1024
+
+# generations probe() runs, and how often it looks at the pattern while it does
+PROBE_GENS, PROBE_STEP = 256, 32
+# sims shorter than this, in generations, are left to QuickLife without probing
+PROBE_MIN_GENS = 4 * PROBE_GENS
+# patterns bigger than this, in cells of their bounding box, are taken to be chaotic without probing
+PROBE_MAX_CELLS = 1 << 16
+# live cells per cell of the bounding box below which a pattern is sparse enough for HashLife
+PROBE_DENSITY = 1 / 64
+
+
+def worthwhile(name, algo, population, step):
+    """
+    Whether engine `name` is worth running in place of `algo`'s simulator on a pattern
+    of `population` live cells simmed every `step` generations
+    """
+    if name not in DENSE_ENGINES:
+        return True
+    if algo not in DENSE_ENGINES[name]:
+        return False
+    min_population, max_step = DENSE_ENGINES[name][algo]
+    return population >= min_population and step <= max_step
+
+
+def find_engine(rule, algo, hashlife=None, population=None, step=1):
+    """
+    Name of the first engine that supports `rule`, or None to fall back to `algo`'s
+    simulator. If `hashlife` is True or False, only engines that are or aren't in
+    HASHLIFE_ENGINES count. Given the `population` of the pattern to be simmed every
+    `step` generations, engines that aren't worthwhile() for it don't count either.
+    """
+    return next(
+        (
+            name for name, engine in ENGINES.items()
+            if (hashlife is None or hashlife == (name in HASHLIFE_ENGINES))
+            and (population is None or worthwhile(name, algo, population, step))
+            and engine.supports(rule, algo)
+        ),
+        None
+    )
+
+
+def simulate(name, rule, pattern, path, gen, step, resume=False, timeout=5 * 60):
+    """
+    Simulates `pattern` (RLE) with engine `name`, writing its frames to `path`; or, if
+    `resume`, carries on from the last frame there, adding the ones after it. Returns
+    an error message if it failed or an empty string otherwise, like CA.run_bgolly.
+    """
+    engine = ENGINES[name]
+    try:
+        cells, (x, y) = framestore.last(path) if resume else parse_pattern(pattern)
+    except ValueError as e:
+        return f'Error: {e}'
+    deadline = time.monotonic() + timeout
+    error = ''
+    with framestore.FrameWriter(path, append=resume) as writer:
+        evolution = engine.evolve(rule, cells, x, y, gen, step)
+        if resume:
+            next(evolution)  # the last frame, which is already stored
+        try:
+            for cells, x, y in evolution:
+                if cells.size > MAX_CELLS:
+                    error = 'Error: Pattern grew too large to render'
+                    break
+                writer.write(cells, x, y)
+                if time.monotonic() > deadline:
+                    error = f'Error: Timed out after {timeout // 60} minutes'
+                    break
+        except MemoryError:
+            error = 'Error: Pattern grew too large to render'
+    if error and not resume:
+        os.remove(path)
+    return error
+
+
+def simulate_timeline(name, rule, pattern, path, gens, timeout=5 * 60):
+    """
+    Like simulate(), but writes the generations in `gens` (increasing, from 0) rather
+    than every step-th, each worked out from the one before. With an engine like
+    lifelib, whose memory of the patterns it has seen lasts from one run to the next,
+    each frame takes time that grows with the log of the gap. If the pattern outgrows
+    MAX_CELLS or time runs out, stops early, keeping the frames so far.
+    """
+    engine = ENGINES[name]
+    try:
+        cells, (x, y) = parse_pattern(pattern)
+    except ValueError as e:
+        return f'Error: {e}'
+    deadline = time.monotonic() + timeout
+    with framestore.FrameWriter(path) as writer:
+        for before, after in zip([0, *gens], gens):
+            if after > before and cells.size:
+                try:
+                    *_, (cells, x, y) = engine.evolve(rule, cells, x, y, after - before, after - before)
+                except MemoryError:
+                    break
+            if cells.size > MAX_CELLS:
+                break
+            writer.write(cells, x, y)
+            if time.monotonic() > deadline:
+                break
+    if not os.path.getsize(path):
+        os.remove(path)
+        return 'Error: Pattern too large to render'
+    return ''
+
+
+def simulate_final(name, rule, pattern, path, gen, rulestring, max_bytes, timeout=5 * 60):
+    """
+    Simulates `pattern` (RLE) with engine `name` to generation `gen` and writes that
+    generation to `path`.rle (or `path`.mc; see lifelib.save), its header giving the
+    rule as `rulestring`. Returns an error message or an empty string, like simulate(),
+    and (population, bounding box as (x, y, width, height) or None if the pattern died
+    out, the file written or None if it would have been bigger than `max_bytes`).
+    """
+    engine = ENGINES[name]
+    try:
+        cells, (x, y) = parse_pattern(pattern)
+    except ValueError as e:
+        return f'Error: {e}', None
+    if hasattr(engine, 'save'):
+        return '', engine.save(rule, cells, x, y, gen, path, max_bytes)
+    deadline = time.monotonic() + timeout
+    for done in range(0, gen, FINAL_CHUNK):
+        if not cells.size:
+            break
+        chunk = min(FINAL_CHUNK, gen - done)
+        try:
+            *_, (cells, x, y) = engine.evolve(rule, cells, x, y, chunk, chunk)
+        except MemoryError:
+            cells = None
+        if cells is None or cells.size > MAX_CELLS:
+            return f'Error: Pattern grew too large by generation {done + chunk}', None
+        if time.monotonic() > deadline:
+            return f'Error: Timed out after {timeout // 60} minutes at generation {done + chunk}', None
+    if not cells.size:
+        return '', (0, None, None)
+    population = int(np.count_nonzero(cells))
+    height, width = cells.shape
+    rle = encode_rle(cells, bool(cells.max() < 2))
+    if len(rle) > max_bytes:
+        return '', (population, (x, y, width, height), None)
+    with open(f'{path}.rle', 'w') as file:
+        file.write(f'#CXRLE Pos={x},{y} Gen={gen}\nx = {width}, y = {height}, rule = {rulestring}\n{rle}\n')
+    return '', (population, (x, y, width, height), f'{path}.rle')
+
+
+def probe(name, rule, pattern, gen):
+    """
+    Runs `pattern` (RLE) for its first few generations with engine `name`, which works
+    out every generation, to guess whether HashLife would get to `gen` sooner.
+    HashLife wins on patterns that repeat themselves and on ones that spread out
+    sparsely, like methuselahs throwing off gliders, while working out every cell of
+    the bounding box wins on dense, chaotic ones like soups. Returns whether to use
+    HashLife and why.
+    """
+    if gen < PROBE_MIN_GENS:
+        return False, 'too few generations to be worth probing'
+    cells, (x, y) = parse_pattern(pattern)
+    if cells.size > PROBE_MAX_CELLS:
+        return False, 'too big to probe'
+    seen, frames = set(), []
+    for cells, x, y in ENGINES[name].evolve(rule, cells, x, y, PROBE_GENS, PROBE_STEP):
+        if not cells.size:
+            return False, 'dies out'
+        key = cells.shape, cells.tobytes()
+        if key in seen:
+            return True, 'repeats itself'
+        seen.add(key)
+        frames.append((cells.shape, int(np.count_nonzero(cells))))
+    # Extrapolate the bounding box and population from how they grew over the last stretch
+    ((height0, width0), population0), ((height, width), population) = frames[-2:]
+    scale = (gen - PROBE_GENS) / PROBE_STEP
+    area = (height + max(0, height - height0) * scale) * (width + max(0, width - width0) * scale)
+    density = (population + max(0, population - population0) * scale) / area
+    if density < PROBE_DENSITY:
+        return True, f'spreads out to {density:.1e} live cells per cell'
+    return False, f'stays dense at {density:.1e} live cells per cell'
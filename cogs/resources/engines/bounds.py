@@ -0,0 +1,18 @@
+"""
+Bounding-box helpers shared by the NumPy engines.
+"""
+import numpy as np
+
+# frames whose bounding box holds more cells than this are too big to render anyway
+MAX_CELLS = 1 << 26
+
+
+def crop(grid, margin):
+    """Trims `grid` to its nonzero cells plus `margin` on every side; returns it and its top-left offset"""
+    rows, cols = np.flatnonzero(grid.any(1)), np.flatnonzero(grid.any(0))
+    if not rows.size:
+        return grid[:0, :0], 0, 0
+    top, left = rows[0] - margin, cols[0] - margin
+    cropped = grid[max(0, top):rows[-1] + 1, max(0, left):cols[-1] + 1]
+    pad = ((max(0, -top), margin), (max(0, -left), margin))
+    return np.pad(cropped, pad), int(top), int(left)
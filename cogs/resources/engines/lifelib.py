@@ -0,0 +1,129 @@
+"""
+Two-state and Generations rules, totalistic or not, advanced by lifelib.
+
+lifelib compiles a shared object for each rule, which takes about a minute, so
+only rules already compiled are supported; compile_rule() builds one for next time.
+save() writes out a far generation without ever holding the pattern as a grid.
+"""
+import os
+import re
+
+import lifelib
+import numpy as np
+from lifelib.genera import rule_property, sanirule
+
+from cogs.resources.engines.bounds import MAX_CELLS
+
+# algos sim would otherwise use for the rules lifelib can run
+ALGOS = {'QuickLife', 'HashLife', 'Generations'}
+
+# B0 rules, which Golly emulates by alternating between two rules and lifelib doesn't
+rB0 = re.compile(r'(?:g\d+)?b0')
+
+# rule -> (lifetree, array mapping lifelib's state numbers to Golly's, the reverse)
+_lifetrees = {}
+
+
+def canonical(rule):
+    """lifelib's name for `rule`, or None if lifelib can't run it"""
+    try:
+        name = sanirule(rule, drop_history=True)
+        rule_property(name, 'family')
+    except (ValueError, KeyError, IndexError):
+        return None
+    return None if rB0.match(name) else name
+
+
+def compiled(name):
+    return os.path.exists(os.path.join(os.path.dirname(lifelib.__file__), 'pythlib', f'lifelib_{name}.so'))
+
+
+def supports(rule, algo):
+    name = algo in ALGOS and canonical(rule)
+    return bool(name) and compiled(name)
+
+
+def compile_rule(rule):
+    """
+    Compiles `rule` so that it's supported from now on. lifelib builds in its own
+    directory, so compiles shouldn't run in parallel.
+    """
+    lifelib.load_rules(canonical(rule))
+
+
+def lifetree(rule):
+    name = canonical(rule)
+    if name not in _lifetrees:
+        lt = lifelib.load_rules(name).lifetree()
+        n_states = int(name[1:name.index('b')]) if name.startswith('g') else 2
+        # Cells read and written as arrays use lifelib's own state numbering, which
+        # only RLE marked as using Golly's numbering is translated from
+        probe = lt.pattern(
+            f'#CLL state-numbering golly\nx = 0, y = 0, rule = {name}\n'
+            + ''.join('.' + chr(ord('A') + state - 1) for state in range(1, n_states)) + '!'
+        )
+        internal = probe[np.array([[2 * i + 1, 0] for i in range(n_states - 1)], np.int64).reshape(-1, 2)]
+        to_golly = np.zeros(1 + int(internal.max(initial=1)), np.uint8)
+        to_golly[internal.astype(np.intp)] = np.arange(1, n_states)
+        from_golly = np.concatenate([[0], internal]).astype(np.uint64)
+        _lifetrees[name] = lt, to_golly, from_golly
+    return _lifetrees[name]
+
+
+def load(rule, cells, x, y):
+    """A lifelib pattern of the state grid `cells`, whose top-left cell is at (x, y)"""
+    lt, _, from_golly = lifetree(rule)
+    pattern = lt.pattern()
+    ys, xs = np.nonzero(cells)
+    if xs.size:
+        pattern[np.stack([xs + x, ys + y], 1).astype(np.int64)] = from_golly[cells[ys, xs]]
+    return pattern
+
+
+def evolve(rule, cells, x, y, gen, step):
+    _, to_golly, from_golly = lifetree(rule)
+    pattern = load(rule, cells, x, y)
+    for frame in range(1 + -(-gen // step)):
+        if frame:
+            pattern = pattern.advance(step)
+        rect = pattern.getrect()
+        if rect is None:
+            yield np.zeros((0, 0), np.uint8), 0, 0
+            continue
+        left, top, width, height = rect
+        if width * height > MAX_CELLS:
+            # A spaceship or two a long way out would otherwise take gigabytes of dead cells
+            raise MemoryError(f'Bounding box of {width}x{height} cells is too big to hold')
+        coords = pattern.coords()
+        grid = np.zeros((height, width), np.uint8)
+        states = to_golly[pattern[coords].astype(np.intp)] if len(from_golly) > 2 else 1
+        grid[coords[:, 1] - top, coords[:, 0] - left] = states
+        yield grid, left, top
+
+
+def save(rule, cells, x, y, gen, path, max_bytes):
+    """
+    Advances the pattern `gen` generations and writes it to `path`.rle, or, for a
+    two-state rule whose RLE would take more than `max_bytes`, to `path`.mc, whose
+    repeated blocks are stored once. Macrocell files use lifelib's own state numbers,
+    which only match Golly's for two-state rules. Returns the population, the bounding
+    box as (x, y, width, height) or None if the pattern died out, and the file written,
+    or None if there was none or it came out bigger than `max_bytes`.
+    """
+    pattern = load(rule, cells, x, y).advance(gen)
+    rect = pattern.getrect()
+    if rect is None:
+        return 0, None, None
+    rect, population = tuple(map(int, rect)), int(pattern.population)
+    two_state = len(lifetree(rule)[2]) == 2
+    header = f'#CXRLE Pos={rect[0]},{rect[1]} Gen={gen}\n'
+    formats = ['rle', 'mc'] if two_state else ['rle']
+    if two_state and 2 * population > max_bytes:
+        formats = ['mc']  # RLE takes a couple of bytes a live cell, so it wouldn't fit
+    for file_format in formats:
+        written = f'{path}.{file_format}'
+        pattern.write_file(written, header=header if file_format == 'rle' else None)
+        if os.path.getsize(written) <= max_bytes:
+            return population, rect, written
+        os.remove(written)
+    return population, rect, None
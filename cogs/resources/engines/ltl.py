@@ -0,0 +1,167 @@
+"""
+Larger than Life and HROT rules, on NumPy grids.
+
+Each generation, every cell's count of live neighbours within range R comes
+from separable box sums for the Moore neighbourhood, or from a row-wise prefix
+sum, one row of the diamond at a time, for the von Neumann neighbourhood. Counts
+are kept in the narrowest integers that hold them, bytes up to range 7, and are
+tested against each range of births or survivals with a single comparison.
+With C > 2 states, cells that die decay through states 2 to C-1 before
+disappearing, and only state 1 counts as alive.
+"""
+import re
+
+import numpy as np
+
+from cogs.resources.engines.bounds import crop
+
+# R5,C0,M1,S34..58,B34..45,NM: Larger than Life, as bgolly reads it
+rLTL = re.compile(r'R(\d+),C(\d+),M([01]),S(\d+)\.\.(\d+),B(\d+)\.\.(\d+),N([NM])', re.I)
+# R5,C2,S34-58,B34-45,NM: HROT, as CAViewer reads it, with the centre cell never counted
+rHROT = re.compile(r'R(\d+),C(\d+),S([\d,-]*),B([\d,-]*)(?:,N([NM]))?', re.I)
+
+# algos sim would otherwise use for these rules
+ALGOS = {'Larger than Life', 'CAViewer'}
+
+
+def parse_counts(spec):
+    """'2-3,5,6' -> [(2, 3), (5, 6)], the ranges of counts listed"""
+    ranges = []
+    for low, high in sorted((int(low), int(high or low)) for low, _, high in (
+            item.partition('-') for item in filter(None, spec.split(','))
+    )):
+        if ranges and low <= ranges[-1][1] + 1:
+            ranges[-1] = ranges[-1][0], max(high, ranges[-1][1])
+        elif low <= high:
+            ranges.append((low, high))
+    return ranges
+
+
+def in_ranges(counts, ranges):
+    """Whether each of `counts` falls in one of `ranges`"""
+    result = None
+    for low, high in ranges:
+        if counts.dtype.kind == 'u':
+            # Counts below `low` wrap around to far above `high`
+            inside = np.subtract(counts, low, dtype=counts.dtype) <= high - low
+        else:
+            inside = (counts >= low) & (counts <= high)
+        result = inside if result is None else result | inside
+    return np.zeros(counts.shape, bool) if result is None else result
+
+
+def shift_ranges(ranges, shift, size):
+    """`ranges` moved up by `shift` and cut down to the counts below `size`"""
+    return [(low + shift, min(high + shift, size - 1)) for low, high in ranges if low + shift < size]
+
+
+def hood_size(r, hood):
+    """Cells in range `r` of a cell, the cell included"""
+    return (2 * r + 1) ** 2 if hood == 'M' else 2 * r * (r + 1) + 1
+
+
+def parse_rule(rule):
+    """
+    Returns (range, states, neighbourhood 'M' or 'N', whether the centre cell is
+    counted, survival counts, birth counts) for `rule`, or None if this engine can't run it
+    """
+    if rmatch := rLTL.fullmatch(rule):
+        r, c, middle, s_low, s_high, b_low, b_high, hood = rmatch.groups()
+        survival, birth = f'{s_low}-{s_high}', f'{b_low}-{b_high}'
+        middle = middle == '1'
+    elif rmatch := rHROT.fullmatch(rule):
+        r, c, survival, birth, hood = rmatch.groups()
+        middle = False
+    else:
+        return None
+    r, c, hood = int(r), max(2, int(c)), (hood or 'M').upper()
+    if not 1 <= r <= 500 or c > 256:
+        return None
+    try:
+        survival, birth = parse_counts(survival), parse_counts(birth)
+    except ValueError:
+        return None
+    if birth and birth[0][0] == 0:
+        return None  # B0 would fill the whole plane
+    return r, c, hood, middle, survival, birth
+
+
+def supports(rule, algo):
+    return algo in ALGOS and parse_rule(rule) is not None
+
+
+def window_sums(a, width, axis):
+    """
+    Sums of every `width` consecutive entries of `a` along `axis`. Rather than
+    differencing a cumulative sum, sums of runs of 1, 2, 4... entries are built up by
+    doubling and combined according to the bits of `width`, which takes far fewer
+    passes over the array than cumsum does in practice.
+    """
+    def span(start, stop=None):
+        return (slice(None),) * axis + (slice(start, stop),)
+
+    n = a.shape[axis] - width + 1
+    total, offset, run, length = None, 0, a, 1
+    while True:
+        if width & length:
+            part = run[span(offset, offset + n)]
+            total = part.copy() if total is None else total + part
+            offset += length
+        if 2 * length > width:
+            return total
+        run = run[span(None, -length)] + run[span(length)]
+        length *= 2
+
+
+def neighbours(alive, r, hood):
+    """Counts the live cells in range `r` of each cell of `alive`, including the cell itself"""
+    height, width = alive.shape
+    size = hood_size(r, hood)
+    dtype = np.uint8 if size < 1 << 8 else np.uint16 if size < 1 << 16 else np.int32
+    padded = np.zeros((height + 2 * r, width + 2 * r), dtype)
+    padded[r:r + height, r:r + width] = alive
+    if hood == 'M':
+        # Down the columns first, which adds whole rows at a time
+        return window_sums(window_sums(padded, 2 * r + 1, 0), 2 * r + 1, 1)
+    rows = np.zeros((height + 2 * r, width + 2 * r + 1), np.int32)
+    np.cumsum(padded, 1, out=rows[:, 1:])
+    counts = np.zeros((height, width), np.int32)
+    for dy in range(-r, r + 1):
+        reach = r - abs(dy)
+        band = rows[r + dy:r + dy + height]
+        counts += band[:, r + reach + 1:r + reach + 1 + width] - band[:, r - reach:r - reach + width]
+    return counts
+
+
+def evolve(rule, cells, x, y, gen, step):
+    r, c, hood, middle, survival, birth = parse_rule(rule)
+    # Counts include the cell itself, which only a live cell adds to, so that is made
+    # up for in the survival ranges; and ranges are cut to fit in the counts' dtype
+    size = hood_size(r, hood) + 1
+    birth, survival = shift_ranges(birth, 0, size), shift_ranges(survival, 0 if middle else 1, size)
+    grid, top, left = crop(cells, r)
+    x, y = x + left, y + top
+    for frame in range(1 + -(-gen // step)):
+        for _ in range(step if frame and grid.size else 0):
+            alive = grid == 1
+            counts = neighbours(alive, r, hood)
+            born = in_ranges(counts, birth)
+            born &= grid == 0
+            survived = in_ranges(counts, survival)
+            survived &= alive
+            if c == 2:
+                grid = (born | survived).view(np.uint8)
+            else:
+                # Decaying cells move on a state, and live cells that don't survive start decaying
+                grid = grid + (grid > 1)
+                grid[alive] = 2
+                if c < 256:  # otherwise the last state already wrapped around to 0
+                    grid[grid == c] = 0
+                grid[born | survived] = 1
+            grid, top, left = crop(grid, r)
+            x, y = x + left, y + top
+        cropped, top, left = crop(grid, 0)
+        if cropped.size:
+            yield cropped.copy(), x + left, y + top
+        else:
+            yield cropped, 0, 0
@@ -0,0 +1,196 @@
+"""
+Two-state and Generations rules on the Moore, hexagonal or von Neumann
+neighbourhood, totalistic, isotropic non-totalistic or MAP, by table lookup.
+
+A rule compiles to one entry per arrangement of a cell and its neighbours: 512
+for Moore, 128 for hexagonal, 32 for von Neumann. Each generation, every cell's
+arrangement is packed into an index with shifted ORs of the live cells, the
+next generation's live cells are a single gather from the table, and with
+Generations a second, per-state table moves every other cell on.
+"""
+import base64
+import re
+from functools import lru_cache
+from itertools import product
+
+import numpy as np
+
+from cogs.resources.engines.bounds import crop
+
+# MAP followed by base64 of the table, 86 characters for Moore, 22 for hexagonal, 6 for von Neumann
+rMAP = re.compile(r'MAP([A-Za-z0-9+/]{86}|[A-Za-z0-9+/]{22}|[A-Za-z0-9+/]{6})')
+# B3/S23, B2-a/S12, B3S23H: birth and survival conditions, then an optional neighbourhood
+rBS = re.compile(r'B([0-8cekainyqjrtwz-]*)/?S?([0-8cekainyqjrtwz-]*)([HV]?)', re.I)
+# 23/3, 345/2/4, 12/34/3V: survival, birth, then optionally Generations' number of states
+rSB = re.compile(r'/?([0-8]*)/([0-8]*)(?:/(\d+))?([HV]?)', re.I)
+# a digit followed by the Hensel letters that select or, after a '-', exclude its arrangements
+rCONDITION = re.compile(r'([0-8])(-?)([a-z]*)')
+
+# algos sim would otherwise use for these rules
+ALGOS = {'QuickLife', 'HashLife', 'Generations'}
+
+# neighbourhood -> its cells as (row, column) offsets, in the order of the bits of a
+# table index from the most significant, which is also the order of MAP tables
+NEIGHBOURHOODS = {
+    'M': [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 0), (0, 1), (1, -1), (1, 0), (1, 1)],
+    'H': [(-1, -1), (-1, 0), (0, -1), (0, 0), (0, 1), (1, 0), (1, 1)],
+    'V': [(-1, 0), (0, -1), (0, 0), (0, 1), (1, 0)],
+}
+
+# Hensel notation: for each count of up to four live neighbours, one arrangement of
+# each letter; the rest are its rotations and reflections, and arrangements of five
+# or more take the letter of their complement
+_COMPASS = {'NW': (-1, -1), 'N': (-1, 0), 'NE': (-1, 1), 'W': (0, -1),
+            'E': (0, 1), 'SW': (1, -1), 'S': (1, 0), 'SE': (1, 1)}
+HENSEL = {
+    1: {'c': 'NW', 'e': 'N'},
+    2: {'a': 'NW N', 'c': 'NW NE', 'e': 'N W', 'i': 'W E', 'k': 'NE W', 'n': 'NE SW'},
+    3: {'a': 'NW N W', 'c': 'NW NE SW', 'e': 'N W E', 'i': 'NW N NE', 'j': 'N NE W',
+        'k': 'N E SW', 'n': 'NW NE W', 'q': 'N NE SW', 'r': 'NW W E', 'y': 'NW E SW'},
+    4: {'a': 'NW N NE W', 'c': 'NW NE SW SE', 'e': 'N W E S', 'i': 'NW NE W E', 'j': 'N W E SW',
+        'k': 'NW N E SW', 'n': 'NW N NE SW', 'q': 'N NE E SW', 'r': 'NW N W E', 't': 'NW W E SW',
+        'w': 'N NE W SW', 'y': 'NW NE E SW', 'z': 'NE W E SW'},
+}
+
+
+def _symmetries(cells):
+    """The images of a set of neighbour offsets under the square's rotations and reflections"""
+    for _ in range(4):
+        cells = frozenset((dx, -dy) for dy, dx in cells)
+        yield cells
+        yield frozenset((dy, -dx) for dy, dx in cells)
+
+
+@lru_cache(None)
+def hensel_letters():
+    """Maps each set of live Moore neighbours to its Hensel letter, or '' for counts without letters"""
+    letters = {}
+    for count, reps in HENSEL.items():
+        for letter, names in reps.items():
+            for cells in _symmetries({_COMPASS[name] for name in names.split()}):
+                letters[cells] = letter
+                if count < 4:
+                    letters[frozenset(_COMPASS.values()) - cells] = letter
+    return letters
+
+
+def parse_conditions(spec, hood):
+    """
+    '2-a3' -> the set of (count, letter) arrangements it allows, with '' standing in
+    for every letter of totalistic conditions. Raises ValueError if it's malformed.
+    """
+    spec, allowed = spec.lower(), set()
+    if rCONDITION.sub('', spec):
+        raise ValueError(spec)
+    for count, negate, letters in rCONDITION.findall(spec):
+        count = int(count)
+        if count >= len(NEIGHBOURHOODS[hood]):
+            raise ValueError(spec)
+        if not letters:
+            allowed.add((count, ''))
+            continue
+        valid = HENSEL.get(min(count, 8 - count), {}) if hood == 'M' else {}
+        if not valid or not set(letters) <= valid.keys():
+            raise ValueError(spec)
+        allowed.update((count, letter) for letter in (valid.keys() - set(letters) if negate else letters))
+    return allowed
+
+
+def compile_totalistic(birth, survival, hood):
+    """The table for outer-totalistic or isotropic `birth` and `survival` (see parse_conditions)"""
+    offsets = NEIGHBOURHOODS[hood]
+    centre = offsets.index((0, 0))
+    letters = hensel_letters()
+    table = np.zeros(1 << len(offsets), bool)
+    for index, bits in enumerate(product((0, 1), repeat=len(offsets))):
+        live = frozenset(offset for offset, bit in zip(offsets, bits) if bit and offset != (0, 0))
+        conditions = survival if bits[centre] else birth
+        table[index] = (len(live), '') in conditions or (len(live), letters.get(live, '')) in conditions
+    return table
+
+
+@lru_cache(64)
+def parse_rule(rule):
+    """
+    Returns (table, neighbourhood, states) for `rule`, or None if this engine can't
+    run it. The table gives whether each arrangement's centre cell is alive next.
+    """
+    if rmatch := rMAP.fullmatch(rule):
+        code = rmatch[1]
+        hood = {86: 'M', 22: 'H', 6: 'V'}[len(code)]
+        bits = np.unpackbits(np.frombuffer(base64.b64decode(code + '=='), np.uint8))
+        table, states = bits[:1 << len(NEIGHBOURHOODS[hood])].astype(bool), 2
+    else:
+        if rmatch := rBS.fullmatch(rule):
+            birth, survival, hood = rmatch.groups()
+            states = None
+        elif rmatch := rSB.fullmatch(rule):
+            survival, birth, states, hood = rmatch.groups()
+        else:
+            return None
+        hood = hood.upper() or 'M'
+        states = int(states or 2)
+        try:
+            table = compile_totalistic(parse_conditions(birth, hood), parse_conditions(survival, hood), hood)
+        except ValueError:
+            return None
+        if not 2 <= states <= 256:
+            return None
+    if table[0]:
+        return None  # B0 would fill the whole plane
+    table.flags.writeable = False
+    return table, hood, states
+
+
+def supports(rule, algo):
+    return algo in ALGOS and parse_rule(rule) is not None
+
+
+def indices(alive, hood):
+    """
+    Packs each cell's arrangement into a table index. `alive` is a 0/1 uint16
+    grid with a border of dead cells, which loses that border in the result.
+    """
+    top, middle, bottom = alive[:-2], alive[1:-1], alive[2:]
+    if hood == 'M':
+        # Three cells of a row make three bits, and three rows the whole index
+        rows = (alive[:, :-2] << 2) | (alive[:, 1:-1] << 1) | alive[:, 2:]
+        return (rows[:-2] << 6) | (rows[1:-1] << 3) | rows[2:]
+    if hood == 'H':
+        return (
+            (top[:, :-2] << 6) | (top[:, 1:-1] << 5)
+            | (middle[:, :-2] << 4) | (middle[:, 1:-1] << 3) | (middle[:, 2:] << 2)
+            | (bottom[:, 1:-1] << 1) | bottom[:, 2:]
+        )
+    return (
+        (top[:, 1:-1] << 4)
+        | (middle[:, :-2] << 3) | (middle[:, 1:-1] << 2) | (middle[:, 2:] << 1)
+        | bottom[:, 1:-1]
+    )
+
+
+def evolve(rule, cells, x, y, gen, step):
+    table, hood, states = parse_rule(rule)
+    # Each state's next one if the table doesn't make the cell alive: live cells start
+    # decaying, decaying ones move on a state, and the last state dies
+    decay = np.zeros(states, np.uint8)
+    decay[1:-1] = np.arange(2, states)
+    grid, top, left = crop(cells, 1)
+    x, y = x + left, y + top
+    for frame in range(1 + -(-gen // step)):
+        for _ in range(step if frame and grid.size else 0):
+            alive = np.pad(grid == 1, 1).astype(np.uint16)
+            live = np.take(table, indices(alive, hood))
+            if states == 2:
+                grid = live.view(np.uint8)
+            else:
+                # Decaying cells count as dead but can't be born into
+                old, grid = grid, decay[grid]
+                grid[live & (old <= 1)] = 1
+            grid, top, left = crop(grid, 1)
+            x, y = x + left, y + top
+        cropped, top, left = crop(grid, 0)
+        if cropped.size:
+            yield cropped.copy(), x + left, y + top
+        else:
+            yield cropped, 0, 0
@@ -0,0 +1,151 @@
+"""
+One-dimensional rules: Wolfram's elementary ones (W30) and their wider and
+multistate generalizations (R2,C3,W...), a row at a time on NumPy arrays.
+
+A rule is a number whose base-C digits, least significant first, give a cell's
+next state for each arrangement of the 2R+1 cells centred on it, read as a base-C
+number with the leftmost cell most significant. Plain W rules are two-state and
+take the smallest range whose table the number fits in. Each generation, every
+cell's arrangement is built up from shifted copies of the row and looked up in
+the table with one gather.
+
+The bottom row of a pattern is the one evolved, and generation n is drawn n rows
+below it, so the natural picture is the whole spacetime diagram at once (see
+spacetime()); as frames, evolve() scrolls a window of the latest rows instead.
+"""
+import re
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+
+import numpy as np
+
+from cogs.resources.engines.bounds import crop
+
+# W30, W3283936144: two-state, range inferred from the rule number
+rW = re.compile(r'W(\d+)')
+# R2,C3,W...: range, states, rule number
+rRCW = re.compile(r'R([1-9]\d*),C([2-9]\d*),W(\d+)', re.I)
+
+# algos sim would otherwise use for these rules
+ALGOS = {'QuickLife', 'CAViewer'}
+
+# largest table, in arrangements, that a rule can have
+MAX_TABLE = 1 << 16
+
+# generations shown at once by each frame evolve() yields
+SCROLL_ROWS = 200
+
+
+def digits(number, base, count):
+    """The lowest `count` base-`base` digits of `number`, least significant first"""
+    if count <= 64:
+        result = []
+        for _ in range(count):
+            number, digit = divmod(number, base)
+            result.append(digit)
+        return result
+    half = count // 2
+    high, low = divmod(number, base ** half)
+    return digits(low, base, half) + digits(high, base, count - half)
+
+
+@lru_cache(64)
+def parse_rule(rule):
+    """Returns (table, range, states) for `rule`, or None if this engine can't run it"""
+    if rmatch := rW.fullmatch(rule):
+        number, states, r = int(rmatch[1]), 2, 1
+        while number.bit_length() > 2 ** (2 * r + 1):
+            r += 1
+    elif rmatch := rRCW.fullmatch(rule):
+        r, states, number = map(int, rmatch.groups())
+    else:
+        return None
+    size = states ** (2 * r + 1)
+    if states > 256 or size > MAX_TABLE or number >= states ** size:
+        return None
+    if number % states:
+        return None  # a dead arrangement coming alive would fill the whole line
+    table = np.array(digits(number, states, size), np.uint8)
+    table.flags.writeable = False
+    return table, r, states
+
+
+def supports(rule, algo):
+    return algo in ALGOS and parse_rule(rule) is not None
+
+
+def history(rule, row, x):
+    """Yields (row, x) for generation 0 of a row of cells whose leftmost is at `x`, and every generation after"""
+    table, r, states = parse_rule(rule)
+    while True:
+        live = np.flatnonzero(row)
+        if live.size:
+            row, x = row[live[0]:live[-1] + 1], x + int(live[0])
+        else:
+            row = row[:0]
+        yield row, x
+        if not row.size:
+            continue
+        # The next row reaches r cells further each way, each cell looking r cells either side of it
+        padded = np.pad(row, 2 * r)
+        index = np.zeros(row.size + 2 * r, np.intp)
+        for offset in range(2 * r + 1):
+            index *= states
+            index += padded[offset:offset + index.size]
+        row, x = table[index], x - r
+
+
+def stack(rows, left, width):
+    """Draws (row, x) rows one under another onto a grid `width` cells wide starting at `left`"""
+    grid = np.zeros((len(rows), width), np.uint8)
+    for i, (row, x) in enumerate(rows):
+        grid[i, x - left:x - left + row.size] = row
+    return grid
+
+
+def span(rows):
+    """(leftmost x, width) of the cells of some (row, x) rows"""
+    rows = [(row, x) for row, x in rows if row.size]
+    if not rows:
+        return 0, 0
+    left = min(x for _, x in rows)
+    return left, max(x + row.size for row, x in rows) - left
+
+
+def spacetime_bounds(rule, cells, gen):
+    """
+    Most rows and columns spacetime() could draw, without working any of them out:
+    each generation can reach at most the rule's range further each way
+    """
+    _, r, _ = parse_rule(rule)
+    height, width = cells.shape
+    return height + gen, width + 2 * r * gen
+
+
+def spacetime(rule, cells, x, y, gen):
+    """The pattern above generations 1 to `gen` of its bottom row, as (grid, x, y)"""
+    if not cells.size:
+        return cells, 0, 0
+    rows = [(row, x) for row in cells[:-1]]
+    rows.extend(islice(history(rule, cells[-1], x), gen + 1))
+    left, width = span(rows)
+    grid, top, left_crop = crop(stack(rows, left, width), 0)
+    return grid, left + left_crop, y + top
+
+
+def evolve(rule, cells, x, y, gen, step):
+    # Each frame shows the latest SCROLL_ROWS rows, from the pattern down to the current generation
+    window = deque(((row, x) for row in cells[:-1]), SCROLL_ROWS)
+    bottom = cells[-1] if cells.size else np.zeros(0, np.uint8)
+    last = -(-gen // step) * step
+    for generation, state in zip(range(last + 1), history(rule, bottom, x)):
+        window.append(state)
+        if generation % step:
+            continue
+        left, width = span(window)
+        grid, top, left_crop = crop(stack(window, left, width), 0)
+        if grid.size:
+            yield grid, left + left_crop, y + top
+        else:
+            yield grid, 0, 0
@@ -0,0 +1,239 @@
+"""
+Rules given as Golly rule files with a @TABLE section, as fetched from the wiki
+for RuleLoader, compiled into a dense lookup table.
+
+Every arrangement of a cell and its neighbours gets an entry, indexed by the
+arrangement read as a base-n_states number in the table's own order (centre,
+then N, NE, E... clockwise), holding the cell's next state. Transitions are
+expanded once per binding of their repeated variables, and symmetries are dealt
+with by reducing every arrangement to the smallest of its symmetric images, so
+that each transition only has to be written into the table once. As in Golly,
+the first transition that matches an arrangement wins, and arrangements no
+transition matches leave the cell as it is.
+
+The `rule` this engine takes is the rule file's text, not the rule's name.
+"""
+import re
+from functools import lru_cache
+from itertools import product
+
+import numpy as np
+
+from cogs.resources.engines.bounds import crop
+
+# var a={0,1,2}, var b = {a, 3}
+rVAR = re.compile(r'var\s+(\w+)\s*=\s*\{([^}]*)\}')
+
+ALGOS = {'RuleLoader'}
+
+# largest table, in arrangements, this engine will build
+MAX_TABLE = 1 << 22
+
+# neighbourhood -> offsets (row, column) of the cell then its neighbours, in the order
+# transitions list them, and the neighbours' order around the cell for rotations
+NEIGHBOURHOODS = {
+    'moore': [(0, 0), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)],
+    'vonneumann': [(0, 0), (-1, 0), (0, 1), (1, 0), (0, -1)],
+    'hexagonal': [(0, 0), (-1, 0), (0, 1), (1, 1), (1, 0), (0, -1), (-1, -1)],
+    'onedimensional': [(0, 0), (0, -1), (0, 1)],
+}
+
+# symmetry -> (rotations of the neighbours as fractions of a turn, whether reflections count too)
+SYMMETRIES = {
+    'none': (1, False),
+    'rotate2': (2, False),
+    'rotate3': (3, False),
+    'rotate4': (4, False),
+    'rotate6': (6, False),
+    'rotate8': (8, False),
+    'reflect': (1, True),
+    'reflect_horizontal': (1, True),
+    'rotate4reflect': (4, True),
+    'rotate6reflect': (6, True),
+    'rotate8reflect': (8, True),
+}
+
+
+def table_section(text):
+    """The lines of a rule file's @TABLE section, stripped of comments and blanks"""
+    lines, inside = [], False
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if line.startswith('@'):
+            inside = line.split()[0] == '@TABLE'
+        elif inside and line:
+            lines.append(line)
+    return lines
+
+
+def permutations(symmetry, n_neighbours):
+    """The permutations of the neighbours that `symmetry` makes equivalent, as index lists"""
+    turns, reflect = SYMMETRIES[symmetry]
+    if n_neighbours % turns:
+        raise ValueError(symmetry)
+    shift = n_neighbours // turns
+    # A line of two neighbours just swaps them; a ring is mirrored in the axis through its first
+    mirror = [1, 0] if n_neighbours == 2 else [-i % n_neighbours for i in range(n_neighbours)]
+    result = []
+    for turn in range(turns):
+        rotated = [(i + turn * shift) % n_neighbours for i in range(n_neighbours)]
+        result.append(rotated)
+        if reflect:
+            result.append([rotated[i] for i in mirror])
+    return result
+
+
+def parse_table(text):
+    """
+    Reads a rule file's @TABLE section into (n_states, neighbourhood, symmetry,
+    transitions), each transition a list of its entries, centre first and new state
+    last, as either a state or the name of a variable; plus the variables' values.
+    Raises ValueError if there's no table or it's malformed.
+    """
+    n_states = hood = None
+    symmetry = 'none'
+    variables, transitions = {}, []
+    for line in table_section(text):
+        key, colon, value = line.partition(':')
+        if colon and key.strip() in ('n_states', 'neighborhood', 'symmetries'):
+            key, value = key.strip(), value.strip()
+            if key == 'n_states':
+                n_states = int(value)
+            elif key == 'neighborhood':
+                hood = value.lower()
+            else:
+                symmetry = value.lower()
+        elif rmatch := rVAR.fullmatch(line):
+            name, values = rmatch.groups()
+            states = set()
+            for item in filter(None, (item.strip() for item in values.split(','))):
+                states.update(variables[item] if item in variables else {int(item)})
+            variables[name] = sorted(states)
+        else:
+            entries = [entry for entry in re.split(r'[,\s]+', line) if entry]
+            if len(entries) == 1:
+                entries = list(entries[0])
+            transitions.append([entry if entry in variables else int(entry) for entry in entries])
+    if n_states is None or hood not in NEIGHBOURHOODS:
+        raise ValueError('no usable @TABLE')
+    width = len(NEIGHBOURHOODS[hood]) + 1
+    if any(len(transition) != width for transition in transitions):
+        raise ValueError('transition of the wrong length')
+    return n_states, hood, symmetry, transitions, variables
+
+
+def canonical_indices(n_states, n_cells, symmetry):
+    """For every table index, the smallest index of an arrangement symmetric to it"""
+    size = n_states ** n_cells
+    weights = n_states ** np.arange(n_cells - 1, -1, -1)
+    index = np.arange(size, dtype=np.int32)
+    cells = index // weights[:, None].astype(np.int32) % n_states
+    centre, neighbours = cells[0] * weights[0], cells[1:]
+    if symmetry == 'permute':
+        # Any order of the neighbours will do, so the smallest lists them in increasing order
+        return centre + (np.sort(neighbours, 0) * weights[1:, None]).sum(0).astype(np.int32)
+    best = index
+    for permutation in permutations(symmetry, n_cells - 1):
+        best = np.minimum(best, centre + (neighbours[permutation] * weights[1:, None]).sum(0).astype(np.int32))
+    return best
+
+
+def expand(transition, variables, weights):
+    """Yields (table indices, new state) for each binding of a transition's repeated variables"""
+    *inputs, output = transition
+    names = [entry for entry in inputs if isinstance(entry, str)]
+    bound = sorted({name for name in names if names.count(name) > 1 or name == output})
+    for values in product(*(variables[name] for name in bound)):
+        binding = dict(zip(bound, values))
+        index = np.zeros(1, np.int64)
+        for entry, weight in zip(inputs, weights):
+            if isinstance(entry, int):
+                states = [entry]
+            elif entry in binding:
+                states = [binding[entry]]
+            else:
+                states = variables[entry]
+            index = np.add.outer(index, np.array(states, np.int64) * weight).ravel()
+        yield index, binding.get(output, output)
+
+
+def empty_stays_empty(transitions, variables):
+    """Whether a dead cell with no live neighbours stays dead"""
+    for *inputs, output in transitions:
+        if all(entry == 0 if isinstance(entry, int) else 0 in variables[entry] for entry in inputs):
+            # Every variable here is bound to 0
+            return output == 0 or isinstance(output, str)
+    return True
+
+
+@lru_cache(64)
+def parse_rule(text):
+    """parse_table() for the rule file `text`, or None if this engine can't run it"""
+    try:
+        n_states, hood, symmetry, transitions, variables = parse_table(text)
+    except (ValueError, KeyError):
+        return None
+    n_neighbours = len(NEIGHBOURHOODS[hood]) - 1
+    if not 2 <= n_states <= 256 or n_states ** (n_neighbours + 1) > MAX_TABLE:
+        return None
+    if symmetry != 'permute' and (symmetry not in SYMMETRIES or n_neighbours % SYMMETRIES[symmetry][0]):
+        return None
+    for *inputs, output in transitions:
+        if isinstance(output, str) and output not in inputs:
+            return None  # the new state has to come from a variable in the arrangement
+    if not empty_stays_empty(transitions, variables):
+        return None  # empty space coming alive would fill the whole plane
+    return n_states, hood, symmetry, transitions, variables
+
+
+@lru_cache(4)
+def compile_table(text):
+    """
+    Returns (table, offsets, n_states) for the rule file `text`, which has to be
+    supported. The table maps each arrangement's index to the cell's next state.
+    """
+    n_states, hood, symmetry, transitions, variables = parse_rule(text)
+    offsets = NEIGHBOURHOODS[hood]
+    size = n_states ** len(offsets)
+    canonical = canonical_indices(n_states, len(offsets), symmetry)
+    weights = n_states ** np.arange(len(offsets) - 1, -1, -1)
+    # New state of each canonical arrangement, or -1 where no transition matches
+    new = np.full(size, -1, np.int16)
+    for transition in transitions:
+        for index, state in expand(transition, variables, weights):
+            keys = np.unique(canonical[index])
+            keys = keys[new[keys] < 0]
+            new[keys] = state
+    table = new[canonical]
+    # Unmatched arrangements leave the cell alone, and the centre is the most significant digit
+    unmatched = table < 0
+    table[unmatched] = np.arange(size)[unmatched] // weights[0]
+    table = table.astype(np.uint8)
+    table.flags.writeable = False
+    return table, offsets, n_states
+
+
+def supports(rule, algo):
+    """Cheap enough to call outside a worker, since the table itself is only built by evolve()"""
+    return algo in ALGOS and parse_rule(rule) is not None
+
+
+def evolve(rule, cells, x, y, gen, step):
+    table, offsets, n_states = compile_table(rule)
+    grid, top, left = crop(cells, 1)
+    x, y = x + left, y + top
+    for frame in range(1 + -(-gen // step)):
+        for _ in range(step if frame and grid.size else 0):
+            padded = np.pad(grid, 1)
+            height, width = grid.shape
+            index = np.zeros(grid.shape, np.int32)
+            for dy, dx in offsets:
+                index *= n_states
+                index += padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+            grid, top, left = crop(table[index], 1)
+            x, y = x + left, y + top
+        cropped, top, left = crop(grid, 0)
+        if cropped.size:
+            yield cropped, x + left, y + top
+        else:
+            yield cropped, 0, 0
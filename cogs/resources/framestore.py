@@ -0,0 +1,122 @@
+"""
+Binary store for simulated frames, which the in-process engines write in
+place of simulator output text.
+
+Each frame is a fixed-size header -- the position and size of its bounding box,
+how many runs of cells its RLE would have, and how its cells are stored --
+followed by the state grid inside that box, zlib-compressed: bit-packed if it
+only has states 0 and 1, a byte per cell otherwise. Headers can be read without
+touching the grids, so the cheap passes over a sim's frames stay cheap.
+"""
+import os
+import struct
+import zlib
+
+import numpy as np
+
+# x, y, width, height, runs, whether the grid is bit-packed, and its length in bytes
+HEADER = struct.Struct('<qqIIIBI')
+
+# Average length of a run in RLE, counts included, so that a frame store can be sized
+# up the same way as simulator output of the same frames
+RLE_BYTES_PER_RUN = 2.2
+
+
+def count_runs(cells):
+    """How many runs of same-state cells the rows of `cells` split into"""
+    if not cells.size:
+        return 0
+    return len(cells) + int(np.count_nonzero(cells[:, 1:] != cells[:, :-1]))
+
+
+class FrameWriter:
+    """Appends frames to a frame store, starting a new one unless `append`"""
+    def __init__(self, path, append=False):
+        self.file = open(path, 'ab' if append else 'wb')
+
+    def write(self, cells, x, y):
+        """Writes a frame: `cells`, a state grid cropped to its live cells, has its top-left cell at (x, y)"""
+        height, width = cells.shape
+        packed = not cells.size or bool(cells.max() < 2)
+        data = zlib.compress((np.packbits(cells, axis=None) if packed else np.ascontiguousarray(cells)).tobytes(), 1)
+        self.file.write(HEADER.pack(int(x), int(y), width, height, count_runs(cells), packed, len(data)) + data)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def headers(file):
+    """Yields each frame's header fields from an open frame store, leaving it positioned before its grid"""
+    while True:
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return
+        fields = HEADER.unpack(header)
+        yield fields
+        file.seek(fields[-1], os.SEEK_CUR)
+
+
+def read_grid(file, width, height, packed, n_bytes):
+    data = zlib.decompress(file.read(n_bytes))
+    if packed:
+        return np.unpackbits(np.frombuffer(data, np.uint8), count=width * height).reshape(height, width)
+    return np.frombuffer(data, np.uint8).reshape(height, width)
+
+
+def scan(path, every=1):
+    """
+    Same as ca.scan_frames, for a frame store: the bounding box that covers every
+    `every`th frame, the largest such frame's width and height, and the total number
+    of frames. Frames have no colors of their own, so the colors found are always none.
+    """
+    xmin = ymin = maxwidth = maxheight = n_frames = 0
+    xmax = ymax = None
+    with open(path, 'rb') as file:
+        for x, y, width, height, *_ in headers(file):
+            n_frames += 1
+            if (n_frames - 1) % every:
+                continue
+            if xmax is None:
+                xmin, ymin, xmax, ymax = x, y, x + width, y + height
+            xmin, ymin = min(xmin, x), min(ymin, y)
+            xmax, ymax = max(xmax, x + width), max(ymax, y + height)
+            maxwidth, maxheight = max(maxwidth, width), max(maxheight, height)
+    if not n_frames:
+        raise ValueError('Simulator output contains no frames')
+    return (xmin, ymin, xmax - xmin, ymax - ymin), (maxwidth, maxheight), n_frames, {}
+
+
+def rle_size(path):
+    """About how many bytes the frames in a frame store would take up as simulator output"""
+    with open(path, 'rb') as file:
+        return sum(RLE_BYTES_PER_RUN * runs + 16 for _, _, _, _, runs, _, _ in headers(file))
+
+
+def iterate(path):
+    """Yields (cells, position) for each frame in a frame store, reading one frame at a time"""
+    with open(path, 'rb') as file:
+        while True:
+            header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            x, y, width, height, _, packed, n_bytes = HEADER.unpack(header)
+            yield read_grid(file, width, height, packed, n_bytes), (x, y)
+
+
+def last(path):
+    """(cells, position) of the final frame in a frame store"""
+    with open(path, 'rb') as file:
+        offset = fields = None
+        for fields in headers(file):
+            offset = file.tell()
+        if fields is None:
+            raise ValueError('Simulator output contains no frames')
+        x, y, width, height, _, packed, n_bytes = fields
+        file.seek(offset)
+        return read_grid(file, width, height, packed, n_bytes), (x, y)
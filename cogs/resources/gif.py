@@ -0,0 +1,226 @@
+"""
+Streaming GIF encoder for palette-indexed frames.
+
+Frames are uint8 arrays of indices into a single global color table, so
+unlike a general-purpose writer there is no per-frame quantization: the
+caller already knows every color the animation can contain.
+
+LZW compression is done here too, by the compiled kernel in _lzw.pyx when
+Cython (see requirements.txt) and a C compiler are available, and by the
+pure-Python lzw_encode below otherwise. Both produce identical output.
+"""
+import struct
+
+import numpy as np
+
+MAX_CODES = 4096
+
+
+def lzw_encode(data, min_code_size):
+    """
+    GIF-flavored LZW compression of `data` (bytes of palette indices).
+    Returns the code stream packed LSB-first, not yet split into sub-blocks.
+
+    Rather than walking the input a pixel at a time, each step looks up
+    whole slices to find the longest string already in the table. The table
+    is prefix-closed -- if data[i:i+n] is absent, so is anything longer --
+    so this is a search over lengths, started from the previous match's
+    length since neighbouring matches tend to be alike. This keeps the
+    Python-level work per *code* rather than per pixel.
+    """
+    clear = 1 << min_code_size
+    eoi = clear + 1
+    codes, sizes = [clear], [min_code_size + 1]
+    emit_code, emit_size = codes.append, sizes.append
+    singles = {bytes([i]): i for i in range(clear)}
+    table = dict(singles)
+    get = table.get
+    next_code, code_size, longest = eoi + 1, min_code_size + 1, 1
+    i, end, guess = 0, len(data), 1
+    while i < end:
+        cap = min(end - i, longest)
+        guess = min(guess, cap)
+        code = get(data[i:i + guess])
+        if code is not None:
+            # Gallop upwards until a miss (or the cap) bounds the match from above...
+            lo, step = guess, 1
+            while True:
+                hi = lo + step
+                if hi > cap:
+                    hi = cap + 1
+                    break
+                found = get(data[i:i + hi])
+                if found is None:
+                    break
+                code, lo, step = found, hi, 2 * step
+        else:
+            # ...or downwards until a hit bounds it from below
+            hi, step = guess, 1
+            while True:
+                lo = hi - step
+                if lo <= 1:
+                    lo, code = 1, data[i]
+                    break
+                code = get(data[i:i + lo])
+                if code is not None:
+                    break
+                hi, step = lo, 2 * step
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            found = get(data[i:i + mid])
+            if found is None:
+                hi = mid
+            else:
+                code, lo = found, mid
+        emit_code(code)
+        emit_size(code_size)
+        guess = lo
+        i += lo
+        if i >= end:
+            break
+        if next_code < MAX_CODES:
+            if next_code == 1 << code_size:
+                code_size += 1
+            table[data[i - lo:i + 1]] = next_code
+            next_code += 1
+            longest = max(longest, lo + 1)
+        else:
+            emit_code(clear)
+            emit_size(code_size)
+            table = dict(singles)
+            get = table.get
+            next_code, code_size, longest = eoi + 1, min_code_size + 1, 1
+    emit_code(eoi)
+    emit_size(code_size)
+    return pack_codes(codes, sizes)
+
+
+def pack_codes(codes, sizes):
+    """Packs variable-width codes into bytes, least significant bit first"""
+    codes = np.array(codes, np.uint16)
+    sizes = np.array(sizes, np.uint8)
+    bits = (codes[:, None] >> np.arange(12, dtype=np.uint16)) & 1
+    return np.packbits(bits[np.arange(12) < sizes[:, None]].astype(np.uint8), bitorder='little').tobytes()
+
+
+def sub_blocks(data):
+    """Splits `data` into length-prefixed chunks of at most 255 bytes, ending with an empty one"""
+    chunks = (data[i:i + 255] for i in range(0, len(data), 255))
+    return b''.join(bytes((len(chunk),)) + chunk for chunk in chunks) + b'\0'
+
+
+try:  # compiled kernel, if Cython and a C compiler are available
+    import pyximport
+    _importers = pyximport.install(language_level=3)
+    try:
+        from cogs.resources._lzw import lzw_encode as fast_lzw_encode
+    finally:
+        pyximport.uninstall(*_importers)
+except ImportError:
+    fast_lzw_encode = lzw_encode
+
+
+class GIFWriter:
+    """
+    Writes an animated GIF to a path or binary file object one frame at a time.
+
+    palette: (n, 3) array-like of RGB colors, n <= 256, used as the global color table
+    duration: seconds per frame
+    loop: number of repeats, 0 meaning forever
+    delta: after the first frame, only write the rectangle that changed since the
+      previous one, with pixels that didn't change inside it made transparent
+    resume: add frames to a finished GIF written with the same arguments, rather
+      than starting a new one; for delta frames, set `previous` to its last frame
+    """
+    def __init__(self, fp, width, height, palette, *, duration=0.1, loop=0, delta=False, resume=False):
+        palette = np.asarray(palette, np.uint8).reshape(-1, 3)
+        if not 1 <= len(palette) <= 256:
+            raise ValueError(f'GIF palettes hold 1 to 256 colors, not {len(palette)}')
+        self._owned = isinstance(fp, (str, bytes)) or hasattr(fp, '__fspath__')
+        self.fp = open(fp, 'r+b' if resume else 'wb') if self._owned else fp
+        self.width, self.height = width, height
+        self.delay = max(1, round(100 * duration))
+        self.delta = delta
+        # Unchanged pixels in delta frames need a palette slot of their own, if there's one to spare
+        self.transparent = len(palette) if delta and len(palette) < 256 else None
+        self.previous = None
+        self.bytes_written = 0
+        self.closed = False
+        # The color table's size must be a power of two, and codes need at least 2 bits
+        n_colors = len(palette) + (self.transparent is not None)
+        table_bits = max(1, (n_colors - 1).bit_length())
+        self.min_code_size = max(2, table_bits)
+        if resume:
+            # Overwrite the trailer and carry on from there
+            self.bytes_written = self.fp.seek(-1, 2)
+            if self.fp.read(1) != b';':
+                raise ValueError('Can only resume a finished GIF')
+            self.fp.seek(-1, 2)
+            return
+        table = np.zeros((1 << table_bits, 3), np.uint8)
+        table[:len(palette)] = palette
+        self._write(
+            b'GIF89a'
+            + struct.pack('<HHBBB', width, height, 0x80 | (table_bits - 1) << 4 | (table_bits - 1), 0, 0)
+            + table.tobytes()
+            # NETSCAPE2.0 application extension: loop count
+            + b'!\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', loop) + b'\0'
+        )
+
+    def _write(self, data):
+        self.fp.write(data)
+        self.bytes_written += len(data)
+
+    def _write_image(self, image, left=0, top=0, transparent=None, data=None):
+        height, width = image.shape
+        self._write(
+            # Graphic control extension: leave the frame in place, delay, transparency
+            struct.pack(
+                '<3sBHBB', b'!\xf9\x04', 1 << 2 | (transparent is not None), self.delay, transparent or 0, 0
+            )
+            # Image descriptor, with no local color table
+            + struct.pack('<BHHHHB', 0x2C, left, top, width, height, 0)
+            + bytes((self.min_code_size,))
+            + sub_blocks(fast_lzw_encode(image.tobytes(), self.min_code_size) if data is None else data)
+        )
+
+    def append(self, frame):
+        """Appends one full-size frame of palette indices"""
+        frame = np.ascontiguousarray(frame, np.uint8)
+        if not self.delta or self.previous is None:
+            self._write_image(frame)
+        else:
+            changed = frame != self.previous
+            rows, cols = np.flatnonzero(changed.any(1)), np.flatnonzero(changed.any(0))
+            if not rows.size:
+                # Nothing changed, but the frame still has to take up its share of time
+                rows, cols = np.array([0]), np.array([0])
+            top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+            image = frame[top:bottom, left:right]
+            transparent, data = None, fast_lzw_encode(image.tobytes(), self.min_code_size)
+            if self.transparent is not None:
+                # Masking unchanged pixels usually lengthens runs, but scattered changes can
+                # break them up instead, so keep whichever version compresses better
+                masked = np.where(changed[top:bottom, left:right], image, np.uint8(self.transparent))
+                masked_data = fast_lzw_encode(masked.tobytes(), self.min_code_size)
+                if len(masked_data) < len(data):
+                    image, transparent, data = masked, self.transparent, masked_data
+            self._write_image(image, left, top, transparent, data)
+        if self.delta:
+            self.previous = frame
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._write(b';')
+        if self._owned:
+            self.fp.close()
+        else:
+            self.fp.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
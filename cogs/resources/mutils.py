@@ -428,6 +428,203 @@ def colorpatch(states: dict, n_states: int, fg=None, bg=None, start=(255,255,0),
     crange = ColorRange(n_states, start, end)
     return states.get('0', bg), {'.' if i == 0 else state_from(i): states.get(str(i), crange.at(i) if i else bg) for i in range(n_states)}
 
+# ----------------------- Threaded producer/consumer pipelines ---------------------- #
+import queue
+import threading
+import time
+
+_DONE = object()
+
+def pipeline(source, *stages, maxsize=4):
+    """
+    Runs `source` (an iterable) and each of `stages` (callables taking one item)
+    concurrently, passing items along bounded queues:
+      source -> stages[0] -> stages[1] -> ... -> stages[-1]
+    Every step but the last gets its own thread; the last runs in the calling
+    thread and may return a truthy value to stop the pipeline early.
+    
+    Returns the last stage's final return value along with a list of
+    (busy, stall) times in seconds for each step, source first, where
+    stall is time spent blocked waiting on a neighbouring queue.
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize) for _ in stages]
+    timings = [[0.0, 0.0] for _ in range(1 + len(stages))]
+    errors = []
+    
+    def put(q, item, timing):
+        start = time.perf_counter()
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.05)
+                break
+            except queue.Full:
+                pass
+        timing[1] += time.perf_counter() - start
+    
+    def get(q, timing):
+        start = time.perf_counter()
+        item = _DONE
+        while not stop.is_set():
+            try:
+                item = q.get(timeout=0.05)
+                break
+            except queue.Empty:
+                pass
+        timing[1] += time.perf_counter() - start
+        return item
+    
+    def produce(outbox, timing):
+        items = iter(source)
+        while not stop.is_set():
+            start = time.perf_counter()
+            item = next(items, _DONE)
+            timing[0] += time.perf_counter() - start
+            if item is _DONE:
+                break
+            put(outbox, item, timing)
+        put(outbox, _DONE, timing)
+    
+    def relay(func, inbox, outbox, timing):
+        while (item := get(inbox, timing)) is not _DONE:
+            start = time.perf_counter()
+            item = func(item)
+            timing[0] += time.perf_counter() - start
+            put(outbox, item, timing)
+        put(outbox, _DONE, timing)
+    
+    def guarded(func, *args):
+        try:
+            func(*args)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+    
+    threads = [threading.Thread(target=guarded, args=(produce, queues[0], timings[0]), daemon=True)]
+    threads.extend(
+      threading.Thread(target=guarded, args=(relay, func, *queues[i:i+2], timings[i+1]), daemon=True)
+      for i, func in enumerate(stages[:-1])
+      )
+    for thread in threads:
+        thread.start()
+    result = None
+    try:
+        while (item := get(queues[-1], timings[-1])) is not _DONE:
+            start = time.perf_counter()
+            result = stages[-1](item)
+            timings[-1][0] += time.perf_counter() - start
+            if result:
+                break
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return result, [tuple(timing) for timing in timings]
+
+# ------------------------------- Async subprocesses -------------------------------- #
+import asyncio
+import os
+import signal
+
+async def run_process(*args, timeout=None, limit=1500):
+    """
+    Runs a program without blocking the event loop, draining its stdout and
+    stderr as it goes but keeping only the first `limit` bytes of each (enough
+    for an error message in a Discord message). The process is killed if it
+    outlives `timeout` seconds or if the awaiting task is cancelled.
+    
+    Returns (returncode, stdout, stderr), with returncode None on timeout.
+    """
+    proc = await asyncio.create_subprocess_exec(
+      *args,
+      stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+      start_new_session=True  # so that killing it takes any children holding the pipes open too
+      )
+    
+    async def drain(stream):
+        kept = bytearray()
+        while chunk := await stream.read(65536):
+            kept += chunk[:limit - len(kept)]
+        return kept.decode(errors='replace')
+    
+    readers = asyncio.gather(drain(proc.stdout), drain(proc.stderr))
+    try:
+        returncode = await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        returncode = None
+    finally:
+        if proc.returncode is None:
+            os.killpg(proc.pid, signal.SIGKILL)
+            await proc.wait()
+    stdout, stderr = await readers
+    return returncode, stdout, stderr
+
+# ------------------------------- Pattern attachments ------------------------------- #
+import os
+import re
+from itertools import chain
+
+# extensions of the pattern files read from attachments
+PATTERN_EXTENSIONS = ('.rle', '.mc', '.cells')
+# largest pattern attachment downloaded, in bytes
+MAX_PATTERN_BYTES = int(os.getenv('MAX_PATTERN_BYTES', 16 * 1024 * 1024))
+
+# matches an RLE header line, capturing its width, height and rule
+rRLE_HEADER = re.compile(r'x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)(?:\s*,\s*rule\s*=\s*(\S+))?', re.I)
+
+def pattern_attachment(msg):
+    """The first of a message's attachments that's a pattern file, or None"""
+    return next((a for a in msg.attachments if a.filename.lower().endswith(PATTERN_EXTENSIONS)), None)
+
+async def download(attachment, path, session, max_bytes=MAX_PATTERN_BYTES):
+    """
+    Streams an attachment to `path` a chunk at a time, so that it never has to fit in
+    memory. Raises ValueError if it's bigger than `max_bytes`, leaving nothing behind.
+    """
+    if attachment.size > max_bytes:
+        raise ValueError(f'{attachment.filename} is larger than {round(max_bytes / 1024 / 1024, 1):g}MB')
+    written = 0
+    try:
+        async with session.get(attachment.url) as resp:
+            resp.raise_for_status()
+            with open(path, 'wb') as file:
+                async for chunk in resp.content.iter_chunked(65536):
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise ValueError(f'{attachment.filename} is larger than {round(max_bytes / 1024 / 1024, 1):g}MB')
+                    file.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+def pattern_header(path):
+    """
+    Reads the first lines of a pattern file for its format ('rle', 'mc' or 'cells'),
+    the rule it names (or None) and, if it's RLE with a header, its (width, height)
+    """
+    with open(path, errors='replace') as file:
+        first = file.readline()
+        if first.startswith('[M2]'):
+            for line in file:
+                if not line.startswith('#'):
+                    break
+                if line.startswith('#R'):
+                    return 'mc', line[2:].strip() or None, None
+            return 'mc', None, None
+        for line in chain([first], file):
+            line = line.strip()
+            if line.startswith('!'):
+                return 'cells', None, None
+            if not line or line.startswith('#'):
+                continue
+            if rmatch := rRLE_HEADER.match(line):
+                return 'rle', rmatch[3], (int(rmatch[1]), int(rmatch[2]))
+            return ('cells' if set(line) <= set('.O*') else 'rle'), None, None
+    return 'rle', None, None
+
 # -------------------------------------- Misc --------------------------------------- #
 from itertools import cycle
 
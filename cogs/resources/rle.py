@@ -0,0 +1,192 @@
+"""
+Vectorized RLE decoding and encoding.
+
+RLE arrives as bytes, either a frame of simulator output or a pattern a user
+sent, and is turned into runs of cells with NumPy rather than walked a
+character at a time; encode_rle() goes the other way, for patterns too big to
+write out a run at a time. parse_plaintext() reads .cells files the same way.
+"""
+import re
+
+import numpy as np
+
+from cogs.resources import mutils
+
+# RLE state characters -> state numbers
+STATE_CHARS = {**mutils.STATES, 'b': 0, 'o': 1}
+
+# byte-indexed tables for rle_runs: single-character states (-1 if not one), values of
+# the lowercase prefixes of multi-character states, and digits
+RLE_STATES = np.full(256, -1, np.intp)
+for char, state in STATE_CHARS.items():
+    if len(char) == 1:
+        RLE_STATES[ord(char)] = state
+RLE_PREFIXES = np.zeros(256, np.intp)
+RLE_PREFIXES[ord('p'):ord('y') + 1] = 24 * np.arange(1, 11)
+RLE_DIGITS = np.zeros(256, bool)
+RLE_DIGITS[ord('0'):ord('9') + 1] = True
+
+# state numbers -> their RLE characters, as (length, first byte, second byte), for
+# two-state and multistate RLE
+_CHARS = {
+    two_state: np.array([
+        (len(char), ord(char[0]), ord(char[-1]))
+        for char in (('b', 'o') if two_state else (mutils.state_from(state) for state in range(256)))
+    ], np.intp)
+    for two_state in (True, False)
+}
+
+# matches the header line of an RLE file
+rHEADER = re.compile(r'x\s*=', re.I)
+# matches the position in a #CXRLE line
+rCXRLE_POS = re.compile(r'Pos\s*=\s*(-?\d+)\s*,\s*(-?\d+)')
+
+
+def rle_runs(rle):
+    """
+    Splits a frame of RLE (as bytes, without the '!') into runs of live cells.
+    Returns arrays of each run's row, column, length and state.
+    """
+    raw = np.frombuffer(rle, np.uint8)
+    symbols = np.flatnonzero((RLE_STATES[raw] >= 0) | (raw == ord('$')))
+    if not symbols.size:
+        empty = np.zeros(0, np.intp)
+        return empty, empty, empty, empty
+    # Multi-character states ('pA', 'yO', ...) carry a lowercase prefix worth 24 states per letter
+    prefixes = RLE_PREFIXES[raw[symbols - 1]] * (symbols > 0)
+    states = RLE_STATES[raw[symbols]] + prefixes
+    # Run counts are the digits immediately before each symbol (and its prefix), read right to left
+    counts = np.zeros(symbols.size, np.intp)
+    pos = symbols - 1 - (prefixes > 0)
+    place, active = 1, pos >= 0
+    while True:
+        active &= RLE_DIGITS[raw[pos]]
+        if not active.any():
+            break
+        counts += active * (raw[pos].astype(np.intp) - ord('0')) * place
+        place *= 10
+        pos -= 1
+        active &= pos >= 0
+    counts[counts == 0] = 1
+
+    # '$' runs advance the row; every other symbol is a run of cells within it
+    newline = raw[symbols] == ord('$')
+    rows = np.cumsum(np.where(newline, counts, 0))[~newline]
+    counts, states = counts[~newline], states[~newline]
+    # Column of each run: its offset from the start of the frame minus that of its row's first run
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    cols = starts - np.maximum.accumulate(np.where(np.diff(rows, prepend=-1) != 0, starts, 0))
+    # Background runs only matter for positioning, so drop them
+    live = states != 0
+    return rows[live], cols[live], counts[live], states[live]
+
+
+def decode_rle(rle, canvas, dx, dy):
+    """
+    Draws one frame of RLE (as bytes) onto `canvas`, a preallocated
+    state grid, with the pattern's top-left cell at (dx, dy).
+    """
+    rows, cols, counts, states = rle_runs(rle)
+    if not counts.size:
+        return
+    starts = (dy + rows) * canvas.shape[1] + dx + cols
+    offsets = np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    canvas.flat[offsets] = np.repeat(states, counts)
+
+
+def pattern_body(text):
+    """
+    Splits a pattern's RLE, with or without its header lines, into its runs as bytes
+    (without the '!') and the position of its top-left corner, (0, 0) unless a #CXRLE
+    line places it
+    """
+    x = y = 0
+    body = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#'):
+            rmatch = line.startswith('#CXRLE') and rCXRLE_POS.search(line)
+            if rmatch:
+                x, y = int(rmatch[1]), int(rmatch[2])
+        elif not rHEADER.match(line):
+            body.append(line)
+    return ''.join(body).split('!')[0].encode(), (x, y)
+
+
+def pattern_population(text):
+    """Number of live cells in a pattern's RLE, counted without drawing it"""
+    return int(rle_runs(pattern_body(text)[0])[2].sum())
+
+
+def parse_pattern(text):
+    """
+    Reads a pattern's RLE, with or without its header lines, into a state grid
+    cropped to its live cells. Returns the grid and the position of its top-left
+    cell, counted from the RLE's own top-left corner unless a #CXRLE line places it.
+    """
+    rle, (x, y) = pattern_body(text)
+    rows, cols, counts, _ = rle_runs(rle)
+    if not counts.size:
+        return np.zeros((0, 0), np.uint8), (0, 0)
+    top, left = rows.min(), cols.min()
+    cells = np.zeros((rows.max() + 1 - top, (cols + counts).max() - left), np.uint8)
+    decode_rle(rle, cells, -left, -top)
+    return cells, (x + int(left), y + int(top))
+
+
+def parse_plaintext(text):
+    """
+    Reads a pattern in plaintext (.cells) format, 'O' or '*' for live cells and anything
+    else for dead ones, into a state grid cropped to its live cells, like parse_pattern()
+    """
+    rows = [line.rstrip().encode() for line in text.splitlines() if not line.startswith('!')]
+    grid = np.zeros((len(rows), max(map(len, rows), default=0)), np.uint8)
+    for i, row in enumerate(rows):
+        raw = np.frombuffer(row, np.uint8)
+        grid[i, :raw.size] = (raw == ord('O')) | (raw == ord('*'))
+    ys, xs = np.nonzero(grid)
+    if not ys.size:
+        return np.zeros((0, 0), np.uint8), (0, 0)
+    return grid[ys.min():ys.max() + 1, xs.min():xs.max() + 1], (int(xs.min()), int(ys.min()))
+
+
+def encode_rle(cells, two_state=True):
+    """
+    Writes a state grid out as the body of an RLE file, '!' and all, using
+    'b' and 'o' if `two_state` or '.', 'A', 'B'... otherwise.
+    """
+    height, width = cells.shape
+    chars = _CHARS[two_state]
+    flat = cells.ravel()
+    position = np.arange(flat.size)
+    starts = np.flatnonzero((position % width == 0) | (flat != np.roll(flat, 1)))
+    lengths = np.diff(starts, append=flat.size)
+    states = flat[starts].astype(np.intp)
+    # Dead runs at the end of a row go without saying
+    keep = (states != 0) | ((starts + lengths) % width != 0)
+    starts, lengths, states = starts[keep], lengths[keep], states[keep]
+    rows = starts // width
+
+    # Each run is its length (unless 1) then its state, and each row ends in '$' or the final '!'
+    digits = np.where(lengths > 1, np.floor(np.log10(lengths)).astype(np.intp) + 1, 0)
+    run_sizes = digits + chars[states, 0]
+    slots = np.arange(starts.size) + rows  # each run's place among runs and row ends
+    row_ends = np.searchsorted(rows, np.arange(height), 'right') + np.arange(height)
+    sizes = np.zeros(starts.size + height, np.intp)
+    sizes[slots] = run_sizes
+    sizes[row_ends] = 1
+    offsets = np.cumsum(sizes) - sizes
+
+    out = np.zeros(sizes.sum(), np.uint8)
+    out[offsets[row_ends]] = ord('$')
+    out[offsets[row_ends[-1]]] = ord('!')
+    run_offsets = offsets[slots]
+    for place in range(int(digits.max(initial=0))):
+        has = digits > place
+        out[run_offsets[has] + place] = ord('0') + lengths[has] // 10 ** (digits[has] - 1 - place) % 10
+    state_offsets = run_offsets + digits
+    out[state_offsets] = chars[states, 1]
+    double = chars[states, 0] == 2
+    out[state_offsets[double] + 1] = chars[states[double], 2]
+    return out.tobytes().decode()
@@ -0,0 +1,99 @@
+"""
+Cache of rule files fetched from the wiki for RuleLoader sims.
+
+Each rule name maps to its rule file and what extract_rule_info() made of it,
+or to the fact that the wiki has no such rule. Entries live in memory, most
+recently used kept, and on disk, so they outlast restarts. An entry older than
+its time to live is fetched again before use, keeping the parsed info if the
+text hasn't changed, and is used stale if the wiki can't be reached. Rules the
+wiki doesn't have are remembered for a shorter while, in case they're added.
+Sims asking for a rule that's already being fetched wait for that fetch.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+
+import aiohttp
+
+from cogs.resources import mutils
+from cogs.resources.cache import DiskCache, digest
+
+
+class RuleCache:
+    def __init__(self, directory, max_bytes, ttl, miss_ttl, max_entries=256):
+        self.disk = DiskCache(directory, max_bytes)
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.max_entries = max_entries
+        # rule name -> (time fetched, rule file or None if not on the wiki, (name, n_states, colors)),
+        # least recently used first
+        self.entries = OrderedDict()
+        self.pending = {}  # rule name -> task fetching it
+
+    async def get(self, rulename, session):
+        """
+        Returns (rule file as bytes, (name, n_states, colors)) for a rule on the wiki,
+        the info as extract_rule_info() gives it. Raises FileNotFoundError if the wiki
+        doesn't have the rule.
+        """
+        entry = self.entries.get(rulename)
+        if entry is None:
+            loop = asyncio.get_running_loop()
+            entry = await loop.run_in_executor(None, self._load, rulename)
+        if entry is None or self._expired(entry):
+            if rulename not in self.pending:
+                self.pending[rulename] = asyncio.ensure_future(self._refresh(rulename, entry, session))
+                self.pending[rulename].add_done_callback(lambda _: self.pending.pop(rulename, None))
+            # Shielded so that one sim giving up doesn't cancel the fetch for the others
+            entry = await asyncio.shield(self.pending[rulename])
+        self._remember(rulename, entry)
+        fetched, text, info = entry
+        if text is None:
+            raise FileNotFoundError("The specified rulefile was not found")
+        return text.encode(), info
+
+    def _expired(self, entry):
+        fetched, text, _ = entry
+        return time.time() - fetched > (self.miss_ttl if text is None else self.ttl)
+
+    def _remember(self, rulename, entry):
+        self.entries[rulename] = entry
+        self.entries.move_to_end(rulename)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def _key(rulename):
+        return digest('rule', rulename)
+
+    def _load(self, rulename):
+        data = self.disk.get(self._key(rulename))
+        if data is None:
+            return None
+        fetched, text, info = json.loads(data)
+        return fetched, text, info and tuple(info)
+
+    def _store(self, rulename, entry):
+        self.disk.put(self._key(rulename), json.dumps(entry).encode())
+
+    async def _refresh(self, rulename, stale, session):
+        """Fetches a rule afresh, falling back on the `stale` entry, if any, when the wiki can't be reached"""
+        loop = asyncio.get_running_loop()
+        try:
+            text = await mutils.get_rule_from_wiki(rulename, session)
+        except FileNotFoundError:
+            text = None
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if stale is None:
+                raise
+            return stale
+        if text is None:
+            info = None
+        elif stale is not None and stale[1] == text:
+            info = stale[2]
+        else:
+            info = await loop.run_in_executor(None, mutils.extract_rule_info, text.encode())
+        entry = (time.time(), text, info)
+        await loop.run_in_executor(None, self._store, rulename, entry)
+        return entry
@@ -0,0 +1,62 @@
+"""
+Shared directory of rule files for bgolly's RuleLoader.
+
+Each rule file is stored once, under its rule's name and a hash of its text, so
+sims of the same rule share one file and a rule whose text changes on the wiki
+gets a new one. Sims take a reference to a file while bgolly might read it and
+drop it when they finish. Files no sim holds are removed once they've gone unused
+for `max_age` seconds, which also clears out any left behind by a crash.
+"""
+import os
+import time
+from collections import Counter
+
+from cogs.resources.cache import digest
+
+
+class RuleStore:
+    def __init__(self, directory, max_age):
+        os.makedirs(directory, exist_ok=True)
+        self.dir = directory
+        self.max_age = max_age
+        self.refs = Counter()  # stored name -> sims holding it
+        self.sweep()
+
+    @staticmethod
+    def name(rule, text):
+        """The name a rule file of `rule` with the text `text` (bytes) is stored under"""
+        return f'{rule}_{digest(text.decode(errors="replace"))[:16]}'
+
+    def _path(self, name):
+        return os.path.join(self.dir, f'{name}.rule')
+
+    def acquire(self, rule, text):
+        """Stores a rule file if it isn't already and takes a reference to it; returns its name"""
+        name = self.name(rule, text)
+        path = self._path(name)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            with open(f'{path}.tmp', 'wb') as f:
+                f.write(text)
+            os.replace(f'{path}.tmp', path)
+        self.refs[name] += 1
+        return name
+
+    def release(self, name):
+        """Drops a reference acquire() took, then clears out files gone unused too long"""
+        self.refs[name] -= 1
+        if self.refs[name] <= 0:
+            del self.refs[name]
+            os.utime(self._path(name))  # unused from now on, not from when it was acquired
+        self.sweep()
+
+    def sweep(self):
+        cutoff = time.time() - self.max_age
+        for entry in os.scandir(self.dir):
+            name = entry.name.removesuffix('.rule')
+            if name not in self.refs and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass